@@ -11,6 +11,7 @@
 from mo_logs import constants as _constants, exceptions, strings
 from mo_logs import logger
 from mo_logs.exceptions import *
+from mo_logs.lazy import Lazy
 from mo_logs.log_usingPrint import StructuredLogger_usingPrint
 from mo_logs.strings import CR, indent, parse_template
 from mo_logs.utils import *
@@ -0,0 +1,135 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+ONE PROCESS (THE AGGREGATOR) OWNS THE REAL LOGS; OTHER PROCESSES SEND RECORDS TO IT WITH
+{"log_type": "socket", "address": ...} (SEE log_usingSocket)
+
+PARENT:
+    with logger.start(logs=[...]):
+        aggregator = Aggregator("/tmp/app.sock", logger.main_log)
+        ... FORK WORKERS ...
+        aggregator.stop()
+
+WORKER:
+    logger.start(logs={"log_type": "socket", "address": "/tmp/app.sock"})
+"""
+import os
+import socket
+import sys
+
+from mo_threads import Thread
+
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.ring import decode
+
+MAX_DATAGRAM = 64 * 1024
+MAX_BATCH = 1000  # MOST RECORDS GIVEN TO logger AT ONCE
+POLL = 0.1  # SECONDS BETWEEN CHECKS FOR STOP
+
+
+class Aggregator:
+    """
+    RECEIVE RECORDS FROM ALL PRODUCERS, AND SEND THEM, IN BATCHES, TO ONE logger
+    """
+
+    def __init__(self, address, logger, max_batch=MAX_BATCH):
+        """
+        :param address: PATH OF THE SOCKET TO LISTEN ON (REPLACED, IF IT EXISTS)
+        :param logger: THE StructuredLogger TO SEND RECORDS TO (eg logger.main_log, OR A STAND-IN FOR TESTING)
+        :param max_batch: MOST RECORDS SENT TO logger AT ONCE
+        """
+        if not isinstance(logger, StructuredLogger):
+            raise Exception("Expecting a StructuredLogger")
+        self.address = address
+        self.logger = logger
+        self.max_batch = max_batch
+        # METRICS
+        self.datagrams = 0
+        self.records = 0
+        self.batches = 0
+        self.errors = 0
+
+        try:
+            os.remove(address)
+        except FileNotFoundError:
+            pass
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(address)
+        self.socket.settimeout(POLL)
+        self.thread = Thread.run("aggregate logs from " + address, self._worker)
+
+    def _worker(self, please_stop):
+        try:
+            while not please_stop:
+                try:
+                    datagram = self.socket.recv(MAX_DATAGRAM)
+                except socket.timeout:
+                    continue
+                records = self._decode(datagram)
+                # DRAIN WHAT IS WAITING, FROM ALL PRODUCERS, INTO ONE BATCH
+                self.socket.setblocking(False)
+                try:
+                    while len(records) < self.max_batch:
+                        records.extend(self._decode(self.socket.recv(MAX_DATAGRAM)))
+                except BlockingIOError:
+                    pass
+                finally:
+                    self.socket.settimeout(POLL)
+                self._send(records)
+            # ONE LAST DRAIN
+            self.socket.setblocking(False)
+            records = []
+            try:
+                while True:
+                    records.extend(self._decode(self.socket.recv(MAX_DATAGRAM)))
+            except BlockingIOError:
+                pass
+            self._send(records)
+        finally:
+            self.socket.close()
+            try:
+                os.remove(self.address)
+            except FileNotFoundError:
+                pass
+
+    def _decode(self, datagram):
+        self.datagrams += 1
+        output = []
+        for line in datagram.split(b"\n"):
+            try:
+                output.append(decode(line))
+            except Exception:
+                self.errors += 1
+        return output
+
+    def _send(self, records):
+        if not records:
+            return
+        self.records += len(records)
+        self.batches += 1
+        try:
+            self.logger.write_many(records)
+        except Exception as cause:
+            self.errors += 1
+            sys.stderr.write(f"problem in {self.__class__.__name__}: {cause}\n")
+
+    @property
+    def stats(self):
+        """
+        :return: DATAGRAMS RECEIVED, records (AND batches) SENT TO logger, AND errors
+        """
+        return {"datagrams": self.datagrams, "records": self.records, "batches": self.batches, "errors": self.errors}
+
+    def stop(self):
+        """
+        STOP LISTENING; DOES NOT STOP logger
+        """
+        self.thread.stop()
+        self.thread.join()
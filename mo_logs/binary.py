@@ -0,0 +1,381 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+COMPACT BINARY LOG FORMAT
+
+    FILE   = MAGIC FRAME*
+    FRAME  = type:byte length:varint payload
+    STRING FRAME:  id:varint utf8         (APPEND-ONLY DICTIONARY OF TEMPLATES, KEYS, AND COMMON VALUES)
+    RECORD FRAME:  template:varint timestamp:zigzag severity:varint fields:value
+    RESET FRAME:   (EMPTY)                (THE DICTIONARY IS FULL; START A NEW, EMPTY, ONE)
+
+timestamp IS MICROSECONDS SINCE THE PREVIOUS RECORD (THE FIRST IS SINCE EPOCH)
+A FIELD (LIKE machine OR thread) EQUAL TO THE SAME FIELD OF THE PREVIOUS RECORD IS WRITTEN AS ONE TAG
+A TRUNCATED LAST FRAME (THE PROCESS DIED) IS IGNORED
+
+USAGE:  python -m mo_logs.binary [--expand] [--start TIME] [--end TIME] [--severity SEVERITY] FILE
+"""
+import struct
+import sys
+from copy import deepcopy
+from datetime import datetime, timedelta
+
+from mo_dots import from_data, to_data
+
+from mo_logs.index import find_regions, matches
+
+MAGIC = b"MOLOGS\x00\x01"
+STRING = 1
+RECORD = 2
+RESET = 3
+
+# VALUE TAGS
+NULL, TRUE, FALSE, INT, FLOAT, STR, REF, LIST, DICT, BYTES, DATETIME, SAME = range(12)
+
+MAX_STRINGS = 100_000  # MOST STRINGS IN THE DICTIONARY
+INTERNED = {"template", "severity", "file", "method", "name", "context"}  # VALUES OF THESE KEYS GO IN THE DICTIONARY
+SKIP = {"timestamp", "severity", "trace_text", "cause_text"}
+EPOCH = datetime(1970, 1, 1)
+_double = struct.Struct("<d")
+_same = object()
+
+
+class Encoder:
+    """
+    TURN (template, params) INTO FRAMES; REMEMBERS THE DICTIONARY, SO USE ONE PER FILE
+    """
+
+    def __init__(self):
+        self.strings = {}
+        self.last_timestamp = 0
+        self.last_fields = {}
+
+    def encode(self, template, params, output):
+        """
+        APPEND FRAMES FOR ONE RECORD (AND ANY NEW STRINGS) TO output (A bytearray)
+        """
+        record = from_data(params)
+        if len(self.strings) >= MAX_STRINGS - 1:
+            # ROOM FOR template AND severity; ANY OTHER STRINGS THAT DO NOT FIT ARE WRITTEN INLINE
+            self.strings.clear()
+            _frame(output, RESET, b"")
+        body = bytearray()
+        _varint(body, self._intern(template, output))
+        timestamp = _micros(record.get("timestamp"))
+        _varint(body, _zigzag(timestamp - self.last_timestamp))
+        self.last_timestamp = timestamp
+        _varint(body, self._intern(record.get("severity") or "", output))
+        fields = {k: v for k, v in record.items() if k not in SKIP}
+        last_fields, self.last_fields = self.last_fields, fields
+        body.append(DICT)
+        _varint(body, len(fields))
+        for k, v in fields.items():
+            self._pack(k, body, output, True)
+            last = last_fields.get(k)
+            if v.__class__ is dict and (v is last or v == last):
+                body.append(SAME)
+            else:
+                self._pack(v, body, output, k in INTERNED)
+        _frame(output, RECORD, body)
+
+    def _intern(self, value, output):
+        """
+        :return: ID OF value IN THE DICTIONARY, ADDING IT (AND ITS FRAME TO output) IF NEW; None IF FULL
+        """
+        id = self.strings.get(value)
+        if id is None and len(self.strings) < MAX_STRINGS:
+            id = self.strings[value] = len(self.strings)
+            payload = bytearray()
+            _varint(payload, id)
+            payload += value.encode("utf8")
+            _frame(output, STRING, payload)
+        return id
+
+    def _pack(self, value, body, output, intern):
+        _type = value.__class__
+        if _type is str:
+            id = self._intern(value, output) if intern else None
+            if id is None:
+                data = value.encode("utf8")
+                body.append(STR)
+                _varint(body, len(data))
+                body += data
+            else:
+                body.append(REF)
+                _varint(body, id)
+        elif _type is int:
+            body.append(INT)
+            _varint(body, _zigzag(value))
+        elif _type is float:
+            body.append(FLOAT)
+            body += _double.pack(value)
+        elif _type is dict:
+            body.append(DICT)
+            _varint(body, len(value))
+            for k, v in value.items():
+                k = k if k.__class__ is str else str(k)
+                self._pack(k, body, output, True)
+                self._pack(v, body, output, k in INTERNED)
+        elif _type is list or _type is tuple:
+            body.append(LIST)
+            _varint(body, len(value))
+            for v in value:
+                self._pack(v, body, output, intern)
+        elif value is None:
+            body.append(NULL)
+        elif value is True:
+            body.append(TRUE)
+        elif value is False:
+            body.append(FALSE)
+        elif _type is bytes:
+            body.append(BYTES)
+            _varint(body, len(value))
+            body += value
+        elif _type is datetime:
+            body.append(DATETIME)
+            _varint(body, _zigzag(_micros(value)))
+        else:
+            self._pack(_default(value), body, output, intern)
+
+
+def read_records(filename, start=None, end=None, severity=None, template=None):
+    """
+    STREAM THE RECORDS IN A BINARY LOG
+    :param start: ONLY RECORDS AT, OR AFTER, THIS TIME (datetime, OR SECONDS SINCE EPOCH)
+    :param end: ONLY RECORDS BEFORE THIS TIME
+    :param severity: ONLY RECORDS OF THIS SEVERITY, OR ABOVE
+    :param template: ONLY RECORDS WITH EXACTLY THIS TEMPLATE
+    :return: GENERATOR OF (template, params) PAIRS
+    """
+    query = start, end, severity, template
+    filtered = any(q is not None for q in query)
+    if filtered:
+        # USE THE SIDECAR INDEX (IF ANY) TO SKIP RECORDS
+        regions = find_regions(filename, *query)
+    else:
+        regions = [{"offset": 0, "end": None, "base": None}]
+    region, regions = regions[0], regions[1:]
+
+    strings = []
+    timestamp = 0
+    last_fields = {}
+    with open(filename, "rb") as source:
+        if source.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{filename} is not a binary log")
+        position = len(MAGIC)
+        while True:
+            header = source.read(1)
+            if not header:
+                return
+            length = _read_varint(source)
+            if length is None:
+                # TRUNCATED
+                return
+            while region and region["end"] is not None and position >= region["end"]:
+                region = regions.pop(0) if regions else None
+            if header[0] == RECORD and not (region and position >= region["offset"]):
+                source.seek(length, 1)
+                position = source.tell()
+                continue
+            payload = source.read(length)
+            if len(payload) < length:
+                # TRUNCATED
+                return
+            if region and position == region["offset"] and region["base"] is not None:
+                timestamp = region["base"]
+                last_fields = {}
+            position = source.tell()
+            if header[0] == STRING:
+                id, i = _unvarint(payload, 0)
+                if id != len(strings):
+                    raise Exception(f"Expecting string {len(strings)}, not {id}")
+                strings.append(payload[i:].decode("utf8"))
+            elif header[0] == RESET:
+                strings = []
+            elif header[0] == RECORD:
+                template_id, i = _unvarint(payload, 0)
+                delta, i = _unvarint(payload, i)
+                timestamp += _unzigzag(delta)
+                severity_id, i = _unvarint(payload, i)
+                params, _ = _unpack(payload, i, strings)
+                for k, v in params.items():
+                    if v is _same:
+                        params[k] = deepcopy(last_fields[k])
+                last_fields = params
+                params = deepcopy(params)
+                params["timestamp"] = EPOCH + timedelta(microseconds=timestamp)
+                params["severity"] = strings[severity_id]
+                if filtered and not matches(params, *query):
+                    continue
+                if params.get("trace"):
+                    _add_text(params)
+                yield strings[template_id], to_data(params)
+
+
+def _add_text(params):
+    """
+    REBUILD THE trace_text AND cause_text, WHICH ARE NOT STORED
+    """
+    from mo_logs.exceptions import Except
+
+    e = Except(
+        severity=params["severity"],
+        template=params.get("template"),
+        params=params.get("params"),
+        cause=params.get("cause"),
+        trace=params["trace"],
+    )
+    params["trace_text"] = e.trace_text
+    params["cause_text"] = e.cause_text
+
+
+def _unpack(payload, i, strings):
+    tag = payload[i]
+    i += 1
+    if tag == STR:
+        length, i = _unvarint(payload, i)
+        return payload[i : i + length].decode("utf8"), i + length
+    elif tag == REF:
+        id, i = _unvarint(payload, i)
+        return strings[id], i
+    elif tag == INT:
+        value, i = _unvarint(payload, i)
+        return _unzigzag(value), i
+    elif tag == FLOAT:
+        return _double.unpack_from(payload, i)[0], i + 8
+    elif tag == DICT:
+        length, i = _unvarint(payload, i)
+        output = {}
+        for _ in range(length):
+            k, i = _unpack(payload, i, strings)
+            output[k], i = _unpack(payload, i, strings)
+        return output, i
+    elif tag == LIST:
+        length, i = _unvarint(payload, i)
+        output = []
+        for _ in range(length):
+            v, i = _unpack(payload, i, strings)
+            output.append(v)
+        return output, i
+    elif tag == NULL:
+        return None, i
+    elif tag == TRUE:
+        return True, i
+    elif tag == FALSE:
+        return False, i
+    elif tag == BYTES:
+        length, i = _unvarint(payload, i)
+        return bytes(payload[i : i + length]), i + length
+    elif tag == DATETIME:
+        value, i = _unvarint(payload, i)
+        return EPOCH + timedelta(microseconds=_unzigzag(value)), i
+    elif tag == SAME:
+        return _same, i
+    raise Exception(f"Unknown tag {tag}")
+
+
+def _frame(output, type, payload):
+    output.append(type)
+    _varint(output, len(payload))
+    output += payload
+
+
+def _varint(output, value):
+    while value > 0x7F:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _unvarint(payload, i):
+    value = shift = 0
+    while True:
+        b = payload[i]
+        i += 1
+        value |= (b & 0x7F) << shift
+        if b < 0x80:
+            return value, i
+        shift += 7
+
+
+def _read_varint(source):
+    value = shift = 0
+    while True:
+        b = source.read(1)
+        if not b:
+            return None
+        value |= (b[0] & 0x7F) << shift
+        if b[0] < 0x80:
+            return value
+        shift += 7
+
+
+def _zigzag(value):
+    return value << 1 if value >= 0 else ((-value) << 1) - 1
+
+
+def _unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+
+def _micros(value):
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            return round(value.timestamp() * 1_000_000)
+        delta = value - EPOCH
+        return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+    return round(float(value) * 1_000_000)
+
+
+def _default(value):
+    from mo_logs.log_usingJsonLines import _default
+
+    value = _default(value)
+    if value.__class__.__name__ == "_Raw":
+        return str.__str__(value)
+    return value
+
+
+def main(args):
+    import argparse
+
+    from mo_json import value2json
+
+    from mo_logs.strings import expand_template
+
+    parser = argparse.ArgumentParser(prog="python -m mo_logs.binary", description="Read a binary log")
+    parser.add_argument("files", nargs="+", metavar="FILE")
+    parser.add_argument("--expand", action="store_true", help="show the expanded template, not the JSON")
+    parser.add_argument("--start", type=_parse_time, help="only records at, or after, this time (ISO or unix)")
+    parser.add_argument("--end", type=_parse_time, help="only records before this time")
+    parser.add_argument("--severity", help="only records of this severity, or above")
+    parser.add_argument("--template", help="only records with exactly this template")
+    args = parser.parse_args(args)
+
+    for filename in args.files:
+        for template, params in read_records(filename, args.start, args.end, args.severity, args.template):
+            if args.expand:
+                print(expand_template(template, params))
+            else:
+                print(value2json(params))
+    return 0
+
+
+def _parse_time(value):
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value)
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,93 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+from collections import OrderedDict
+from weakref import WeakSet
+
+from mo_future import allocate_lock
+
+DEFAULT_CACHE_SIZE = 10_000
+_all_caches = WeakSet()
+
+
+class Cache:
+    """
+    SIZE-BOUNDED dict, EVICTING THE LEAST-RECENTLY-USED KEY
+    KEEPS COUNTS SO TEMPLATE CARDINALITY CAN BE MONITORED
+    """
+
+    def __init__(self, name, max_size=DEFAULT_CACHE_SIZE):
+        self.name = name
+        self.max_size = max_size
+        self.lock = allocate_lock()
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        _all_caches.add(self)
+
+    def get(self, key, default=None):
+        with self.lock:
+            try:
+                value = self.data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __setitem__(self, key, value):
+        with self.lock:
+            self.data[key] = value
+            self.data.move_to_end(key)
+            self._evict()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def resize(self, max_size):
+        with self.lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def _evict(self):
+        # EXPECT self.lock TO BE HAD
+        while len(self.data) > self.max_size:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    @property
+    def stats(self):
+        return {
+            "name": self.name,
+            "size": len(self.data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+def _after_fork_in_child():
+    # A LOCK HELD BY ANOTHER THREAD, WHEN THE PROCESS FORKED, WILL NEVER BE RELEASED
+    for cache in _all_caches:
+        cache.lock = allocate_lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
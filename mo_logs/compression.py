@@ -0,0 +1,149 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+import zlib
+
+from mo_logs import logger
+
+GZIP = "gzip"
+ZSTD = "zstd"
+EXTENSIONS = {GZIP: ".gz", ZSTD: ".zst"}
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+CHUNK_SIZE = 64 * 1024
+
+
+def new_compressor(compression, level=None):
+    """
+    :param compression: gzip OR zstd (zstd REQUIRES THE zstandard PACKAGE)
+    :param level: COMPRESSION LEVEL (default IS THE LIBRARY DEFAULT)
+    :return: STREAMING COMPRESSOR, WITH compress(data), flush() AND finish(), EACH RETURNING BYTES
+    """
+    if compression == GZIP:
+        return _Gzip(level)
+    elif compression == ZSTD:
+        return _Zstd(level)
+    logger.error(
+        "Expecting compression to be one of {known}, not {compression|quote}",
+        known=list(EXTENSIONS),
+        compression=compression,
+    )
+
+
+class _Gzip:
+    """
+    ONE GZIP MEMBER; flush() ENDS ON A BYTE BOUNDARY THE DECOMPRESSOR CAN READ UP TO
+    """
+
+    __slots__ = ["compressor"]
+
+    def __init__(self, level=None):
+        self.compressor = zlib.compressobj(-1 if level is None else level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class _Zstd:
+    """
+    ONE ZSTD FRAME; flush() ENDS A BLOCK, SO THE DECOMPRESSOR CAN READ UP TO IT
+    """
+
+    __slots__ = ["compressor", "flush_block"]
+
+    def __init__(self, level=None):
+        try:
+            import zstandard
+        except Exception as cause:
+            logger.error("zstd compression requires the zstandard package", cause=cause)
+
+        self.compressor = zstandard.ZstdCompressor(level=3 if level is None else level).compressobj()
+        self.flush_block = zstandard.COMPRESSOBJ_FLUSH_BLOCK
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(self.flush_block)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+def compress_file(filename, compression, level=None):
+    """
+    REPLACE filename WITH A COMPRESSED COPY, NAMED WITH THE EXTENSION FOR compression
+    :return: NAME OF THE COMPRESSED FILE
+    """
+    destination = filename + EXTENSIONS[compression]
+    temp = destination + ".tmp"
+    compressor = new_compressor(compression, level)
+    with open(filename, "rb") as source, open(temp, "wb") as output:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            output.write(compressor.compress(chunk))
+        output.write(compressor.finish())
+    os.replace(temp, destination)
+    os.remove(filename)
+    return destination
+
+
+def read_lines(filename):
+    """
+    STREAM THE LINES OF A LOG FILE; PLAIN, GZIP OR ZSTD, AS DETECTED FROM THE CONTENT
+    A FILE THAT WAS NOT CLOSED (THE PROCESS DIED) IS READ UP TO ITS LAST COMPLETE BATCH
+    """
+    remainder = b""
+    for chunk in _read_decompressed(filename):
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line.decode("utf8")
+    if remainder:
+        yield remainder.decode("utf8")
+
+
+def _read_decompressed(filename):
+    with open(filename, "rb") as source:
+        magic = source.read(4)
+        source.seek(0)
+        if magic.startswith(GZIP_MAGIC):
+            new_decompressor = lambda: zlib.decompressobj(31)
+        elif magic.startswith(ZSTD_MAGIC):
+            import zstandard
+
+            new_decompressor = zstandard.ZstdDecompressor().decompressobj
+        else:
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                if not chunk:
+                    return
+                yield chunk
+
+        decompressor = new_decompressor()
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            while chunk:
+                if decompressor.eof:
+                    # MANY MEMBERS (OR FRAMES) MAY BE CONCATENATED
+                    decompressor = new_decompressor()
+                yield decompressor.decompress(chunk)
+                chunk = decompressor.unused_data if decompressor.eof else b""
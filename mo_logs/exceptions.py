@@ -8,12 +8,13 @@
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
 import sys
+from collections.abc import Mapping
 
-from mo_dots import Null, is_data, listwrap, unwraplist, to_data, dict_to_data, Data
+from mo_dots import Null, is_data, listwrap, unwraplist, to_data, dict_to_data, Data, from_data, register_data
 from mo_future import is_text, utcnow
-import traceback
 
-from mo_logs.strings import CR, expand_template, indent, between
+from mo_logs.lazy import Lazy
+from mo_logs.strings import CR, expand_template, indent, between, compile_template
 
 FATAL = "FATAL"
 ERROR = "ERROR"
@@ -24,18 +25,148 @@ INFO = "INFO"
 NOTE = "NOTE"
 TOO_DEEP = 50  # MAXIMUM DEPTH OF CAUSAL CHAIN
 
+# ORDER OF SEVERITY, FOR FILTERING
+SEVERITY_LEVEL = {
+    NOTE: 0,
+    INFO: 0,
+    ALARM: 1,
+    WARNING: 2,
+    ERROR: 3,
+    UNEXPECTED: 4,
+    FATAL: 4,
+}
+
 SHORT_STACKS = sys.version_info >= (3, 12)
 
+_get = object.__getattribute__
+_set = object.__setattr__
+
+LOG_ITEM_KEYS = (
+    "severity",
+    "template",
+    "params",
+    "timestamp",
+    "cause",
+    "trace",
+    "trace_text",
+    "cause_text",
+    "location",
+    "thread",
+    "machine",
+)
+_log_item_keys = set(LOG_ITEM_KEYS)
+
+
+class LogItem(Mapping):
+    """
+    ONE RECORD SENT DOWN THE LOGGING PIPELINE; THE params GIVEN TO StructuredLogger.write()
+    __slots__, SO A LOG CALL DOES NOT ALLOCATE A __dict__, NOR A Data TO WRAP IT
+    ACCESS IS LIKE Data: MISSING FIELDS ARE Null, AND ITEM ACCESS ACCEPTS DOT-DELIMITED PATHS
+    (eg "params.name"), SO TEMPLATES EXPAND AS BEFORE
+    ATTRIBUTES ARE NOT WRAPPED WHEN READ, SO ASSIGN Data, NOT dict, TO FIELDS READ AS params.field.name;
+    record["field"] = value WRAPS value FOR YOU
+    """
+
+    __slots__ = LOG_ITEM_KEYS
 
-class LogItem:
     def __init__(self, severity, template, params, timestamp):
-        self.severity = severity
-        self.template = template
-        self.params = params
-        self.timestamp = timestamp
+        _set(self, "severity", severity)
+        _set(self, "template", template)
+        _set(self, "params", params)
+        _set(self, "timestamp", timestamp)
+
+    def __getattr__(self, key):
+        # ONLY CALLED FOR FIELDS THAT ARE NOT SET
+        if key.startswith("__"):
+            raise AttributeError(key)
+        return Null
+
+    def __getitem__(self, key):
+        name, dot, path = key.partition(".")
+        if name not in _log_item_keys:
+            return Null
+        try:
+            value = _get(self, name)
+        except AttributeError:
+            return Null
+        if value is None:
+            return Null
+        if not dot:
+            return to_data(value)
+        if "." not in path and hasattr(value.__class__, "get"):
+            value = value.get(path)
+            return Null if value is None else to_data(value)
+        # Data WALKS THE REST OF THE PATH
+        return dict_to_data({name: value})[key]
+
+    def __setitem__(self, key, value):
+        # WRAPPED HERE, NOT ON EVERY ACCESS
+        if key not in _log_item_keys:
+            raise KeyError(key)
+        _set(self, key, to_data(value))
+
+    def get(self, key, default=None):
+        """
+        :return: THE RAW (NOT WRAPPED) VALUE OF FIELD key
+        """
+        if key not in _log_item_keys:
+            return default
+        try:
+            value = _get(self, key)
+        except AttributeError:
+            return default
+        return default if value is None else from_data(value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return (k for k in LOG_ITEM_KEYS if self.get(k) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def items(self):
+        """
+        :return: LIST OF (key, RAW value) FOR THE FIELDS THAT ARE SET
+        """
+        get = self.get
+        return [(k, v) for k, v in ((k, get(k)) for k in LOG_ITEM_KEYS) if v is not None]
+
+    def __getstate__(self):
+        state = {}
+        for k in LOG_ITEM_KEYS:
+            try:
+                state[k] = _get(self, k)
+            except AttributeError:
+                pass
+        return state
+
+    def __setstate__(self, state):
+        for k, v in state.items():
+            _set(self, k, v)
+
+    def leaves(self):
+        return dict_to_data(self.__data__()).leaves()
 
     def __data__(self):
-        return dict_to_data(self.__dict__)
+        """
+        :return: dict SHAPED LIKE THE Data RECORD THIS REPLACED: params IS ONE dict, location IS A dict
+        """
+        return {k: _plain(v) for k, v in self.items()}
+
+    def __repr__(self):
+        return f"LogItem({self.__data__()!r})"
+
+
+def _plain(value):
+    # ChainedParams AND FrameInfo BECOME dict; Lazy IS LEFT FOR THE SINK TO RESOLVE
+    if value.__class__ is not Lazy and hasattr(value.__class__, "__data__"):
+        return from_data(value.__data__())
+    return value
+
+
+register_data(LogItem)  # is_data(record) IS True, LIKE THE Data RECORD THIS REPLACED
 
 
 class Except(Exception):
@@ -50,7 +181,7 @@ class Except(Exception):
         self.severity = severity
         self.template = template
         self.params = params
-        self.trace = trace or get_stacktrace(2)
+        self.trace = trace or get_frames(2)
 
     @classmethod
     def wrap(cls, e, stack_depth=0):
@@ -74,9 +205,9 @@ class Except(Exception):
                 trace = _parse_traceback(tb)
                 if SHORT_STACKS:
                     # 3.12 only traces back to first try block
-                    trace = trace + get_stacktrace(stack_depth + 1)
+                    trace.extend(get_frames(stack_depth + 1))
             else:
-                trace = get_stacktrace(stack_depth + 1)
+                trace = get_frames(stack_depth + 1)
 
             cause = Except.wrap(getattr(e, "__cause__", None))
             message = getattr(e, "message", None)
@@ -87,10 +218,34 @@ class Except(Exception):
             else:
                 output = Except(severity=ERROR, template=f"{e.__class__.__name__}: {e}", trace=trace, cause=cause,)
 
-            trace = get_stacktrace(stack_depth + 2)  # +2 = to remove the caller, and it's call to this' Except.wrap()
-            output.trace.extend(trace)
+            trace = get_frames(stack_depth + 2)  # +2 = to remove the caller, and it's call to this' Except.wrap()
+            output._extend_trace(trace)
             return output
 
+    @property
+    def trace(self):
+        """
+        LIST OF {"file", "line", "method"}, INNERMOST FIRST
+        """
+        trace = self._trace
+        if trace is None:
+            trace = self._trace = self._frames.to_trace()
+            self._frames = None
+        return trace
+
+    @trace.setter
+    def trace(self, trace):
+        if isinstance(trace, Frames):
+            self._frames, self._trace = trace, None
+        else:
+            self._frames, self._trace = None, trace
+
+    def _extend_trace(self, frames):
+        if self._trace is None:
+            self._frames.extend(frames)
+        else:
+            self._trace.extend(frames.to_trace())
+
     @property
     def message(self):
         return expand_template(self.template, self.params)
@@ -153,34 +308,122 @@ class Except(Exception):
         return "caused by\n\t" + "and caused by\n\t".join(cause_strings)
 
     def __data__(self):
-        output = to_data({k: getattr(self, k) for k in vars(self)})
+        output = to_data({k: v for k, v in vars(self).items() if not k.startswith("_")})
+        output.trace = self.trace
         output.cause = unwraplist([c.__data__() for c in listwrap(output.cause)])
         return output
 
+    def __reduce__(self):
+        # CODE OBJECTS CAN NOT BE PICKLED
+        self.trace
+        return Exception.__reduce__(self)
+
+
+class FrameInfo(Mapping):
+    """
+    IMMUTABLE {"file", "line", "method"} FOR ONE CODE LOCATION
+    SHARED BY ALL TRACES THAT PASS THROUGH THAT LOCATION; SEE frame_info()
+    """
+
+    __slots__ = ["file", "line", "method", "_code"]
+
+    def __init__(self, code, line):
+        _set(self, "file", code.co_filename)
+        _set(self, "line", line)
+        _set(self, "method", code.co_name)
+        _set(self, "_code", code)  # KEEP code ALIVE, SO ITS id() IS NOT REUSED
+
+    def __getitem__(self, key):
+        if key in FRAME_KEYS:
+            return _get(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(FRAME_KEYS)
+
+    def __len__(self):
+        return len(FRAME_KEYS)
+
+    def __setattr__(self, key, value):
+        raise AttributeError("FrameInfo is immutable")
+
+    def __data__(self):
+        return {"file": self.file, "line": self.line, "method": self.method}
+
+    def __reduce__(self):
+        # CODE OBJECTS CAN NOT BE PICKLED
+        return dict, (self.__data__(),)
+
+    def __repr__(self):
+        return repr(self.__data__())
+
+
+FRAME_KEYS = ("file", "line", "method")
+MAX_FRAME_INFO = 100_000
+_frame_infos = {}
+
+
+def frame_info(code, line):
+    """
+    RETURN THE SHARED FrameInfo FOR GIVEN CODE LOCATION
+    """
+    key = (id(code), line)
+    output = _frame_infos.get(key)
+    if output is None:
+        if len(_frame_infos) >= MAX_FRAME_INFO:
+            # CODE IS BEING GENERATED DYNAMICALLY; START OVER
+            _frame_infos.clear()
+        output = _frame_infos[key] = FrameInfo(code, line)
+    return output
+
+
+class Frames(list):
+    """
+    LIST OF (code, line) PAIRS, INNERMOST FIRST
+    CHEAP TO CAPTURE; CONVERTED TO FrameInfo ONLY WHEN NEEDED
+    """
+
+    __slots__ = []
+
+    def to_trace(self):
+        return [frame_info(c, l) for c, l in self]
+
+
+def get_frames(start=0):
+    """
+    SAME AS get_stacktrace(), BUT RETURNS Frames
+    """
+    output = Frames()
+    try:
+        f = sys._getframe(start + 1)
+    except ValueError:
+        # STACK IS NOT THAT DEEP
+        return output
+    append = output.append
+    while f is not None:
+        append((f.f_code, f.f_lineno))
+        f = f.f_back
+    return output
+
 
 def get_stacktrace(start=0):
-    stack = traceback.extract_stack()[: -start - 1]
-    stack.reverse()
-    stack = [{"file": f.filename, "line": f.lineno, "method": f.name} for f in stack]
-    return stack
+    return get_frames(start + 1).to_trace()
 
 
 def _parse_traceback(tb):
-    trace = []
+    trace = Frames()
     while tb is not None:
-        f = tb.tb_frame
-        trace.append({
-            "file": f.f_code.co_filename,
-            "line": tb.tb_lineno,
-            "method": f.f_code.co_name,
-        })
+        trace.append((tb.tb_frame.f_code, tb.tb_lineno))
         tb = tb.tb_next
     trace.reverse()
     return trace
 
 
+TRACE_LINE = compile_template('File ""{file}"", line {line}, in {method}\n')
+
+
 def format_trace(tbs, start=0):
-    return "".join(expand_template('File ""{file}"", line {line}, in {method}\n', d) for d in tbs[start::])
+    return "".join(TRACE_LINE.expand(d) for d in tbs[start::])
 
 
 class Suppress:
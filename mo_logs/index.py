@@ -0,0 +1,246 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+SIDECAR INDEX FOR LOG FILES, SO A QUERY CAN SEEK STRAIGHT TO THE REGIONS THAT MAY MATCH
+
+THE INDEX FOR example.log IS example.log.idx, ONE LINE OF JSON PER ENTRY:
+
+    {"id": 3, "template": "request {path}"}      # TEMPLATE DICTIONARY
+    {"offset": 0, "end": 4096, "min": 1704067200.1, "max": 1704067259.8, "severity": 5, "templates": "1b"}
+
+EACH BUCKET COVERS WHOLE BATCHES, UP TO period SECONDS; severity AND templates ARE BITMAPS
+ONLY THE FIRST MAX_TEMPLATES TEMPLATES GET AN id; THE REST SHARE ONE "OTHER" BIT
+THE OPEN BUCKET IS WRITTEN WHEN IT CLOSES, SO BYTES AFTER THE LAST ENTRY ARE ALWAYS SEARCHED
+"""
+import json
+from datetime import datetime
+
+from mo_dots import from_data
+
+from mo_logs.exceptions import SEVERITY_LEVEL
+
+EXTENSION = ".idx"
+SEVERITY_BIT = {s: 1 << i for i, s in enumerate(SEVERITY_LEVEL)}
+OTHER_BIT = 1 << len(SEVERITY_BIT)  # ANY SEVERITY NOT KNOWN
+MAX_TEMPLATES = 256  # MOST TEMPLATE ids, SO A BUCKET'S BITMAP IS AT MOST 65 HEX DIGITS
+OTHER_TEMPLATE = MAX_TEMPLATES  # BIT FOR ALL TEMPLATES WITHOUT AN id
+EPOCH = datetime(1970, 1, 1)
+
+
+class IndexWriter:
+    """
+    MAINTAIN THE INDEX FOR ONE LOG FILE; EXPECT ONE add() PER BATCH, WITH THE BYTES THE BATCH WAS WRITTEN TO
+    """
+
+    def __init__(self, filename, period=60):
+        """
+        :param filename: NAME OF THE LOG FILE (NOT THE INDEX)
+        :param period: MOST SECONDS COVERED BY ONE BUCKET
+        """
+        self.filename = filename + EXTENSION
+        self.period = period
+        self.templates = {t: i for i, t in enumerate(read_index(filename)[0])}
+        self.handle = open(self.filename, "ab")
+        self.pending = []  # LINES NOT WRITTEN YET
+        self.bucket = None
+        self.until = None
+
+    def add(self, offset, end, records, base=None, last=None):
+        """
+        :param offset: WHERE THE BATCH STARTS IN THE LOG FILE
+        :param end: WHERE THE BATCH ENDS
+        :param records: THE (template, params) PAIRS IN THE BATCH
+        :param base: FOR THE BINARY FORMAT, THE TIMESTAMP (IN MICROSECONDS) THE FIRST RECORD IS RELATIVE TO
+        :param last: FOR THE BINARY FORMAT, THE TIMESTAMP OF THE LAST RECORD
+        """
+        if not records:
+            return
+        templates = self.templates
+        times = []
+        severity = 0
+        bitmap = 0
+        for _, params in records:
+            params = from_data(params)
+            times.append(_seconds(params.get("timestamp")))
+            severity |= SEVERITY_BIT.get(params.get("severity"), OTHER_BIT)
+            template = params.get("template")
+            id = templates.get(template)
+            if id is None:
+                if len(templates) >= MAX_TEMPLATES:
+                    id = OTHER_TEMPLATE
+                else:
+                    id = templates[template] = len(templates)
+                    self.pending.append({"id": id, "template": template})
+            bitmap |= 1 << id
+
+        bucket = self.bucket
+        if bucket and self.starts_bucket(offset, records):
+            self._close_bucket()
+            bucket = None
+        if not bucket:
+            bucket = self.bucket = {
+                "offset": offset,
+                "end": end,
+                "min": min(times),
+                "max": max(times),
+                "severity": 0,
+                "templates": 0,
+            }
+            if base is not None:
+                bucket["base"] = base
+            self.until = (times[0] // self.period + 1) * self.period
+        bucket["end"] = end
+        if last is not None:
+            bucket["last"] = last
+        bucket["min"] = min(bucket["min"], *times)
+        bucket["max"] = max(bucket["max"], *times)
+        bucket["severity"] |= severity
+        bucket["templates"] |= bitmap
+
+    def starts_bucket(self, offset, records):
+        """
+        :return: True IF add() WILL START A NEW BUCKET, SO A READER MAY START AT offset
+        """
+        bucket = self.bucket
+        if not bucket or bucket["end"] != offset:
+            return True
+        return _seconds(from_data(records[0][1]).get("timestamp")) >= self.until
+
+    def _close_bucket(self):
+        bucket, self.bucket = self.bucket, None
+        bucket["templates"] = format(bucket["templates"], "x")
+        self.pending.append(bucket)
+        self.handle.write("".join(json.dumps(line) + "\n" for line in self.pending).encode("utf8"))
+        self.handle.flush()
+        self.pending.clear()
+
+    def close(self):
+        if self.bucket:
+            self._close_bucket()
+        self.handle.close()
+
+
+def read_index(filename):
+    """
+    :param filename: NAME OF THE LOG FILE
+    :return: (templates, entries) WHERE templates IS THE LIST OF TEMPLATES, BY ID
+    """
+    templates = []
+    entries = []
+    try:
+        with open(filename + EXTENSION, "rb") as source:
+            for line in source:
+                try:
+                    line = json.loads(line)
+                except Exception:
+                    # PARTIAL LAST LINE
+                    break
+                if "template" in line:
+                    templates.extend([None] * (line["id"] + 1 - len(templates)))
+                    templates[line["id"]] = line["template"]
+                else:
+                    line["templates"] = int(line["templates"], 16)
+                    entries.append(line)
+    except FileNotFoundError:
+        pass
+    return templates, entries
+
+
+def find_regions(filename, start=None, end=None, severity=None, template=None):
+    """
+    :param filename: NAME OF THE LOG FILE
+    :param start: ONLY RECORDS AT, OR AFTER, THIS TIME (datetime, OR SECONDS SINCE EPOCH)
+    :param end: ONLY RECORDS BEFORE THIS TIME
+    :param severity: ONLY RECORDS OF THIS SEVERITY, OR ABOVE
+    :param template: ONLY RECORDS WITH EXACTLY THIS TEMPLATE
+    :return: LIST OF {"offset", "end", "base"} BYTE RANGES THAT MAY HOLD MATCHING RECORDS
+             end IS None FOR THE UNINDEXED TAIL OF THE FILE; base IS ONLY FOR THE BINARY FORMAT
+    """
+    templates, entries = read_index(filename)
+    start = None if start is None else _seconds(start)
+    end = None if end is None else _seconds(end)
+    severity_mask = _severity_mask(severity)
+    template_bit = None
+    if template is not None:
+        template_bit = 1 << (templates.index(template) if template in templates else OTHER_TEMPLATE)
+
+    regions = []
+    for e in entries:
+        if start is not None and e["max"] < start:
+            continue
+        if end is not None and e["min"] >= end:
+            continue
+        if not e["severity"] & severity_mask:
+            continue
+        if template_bit is not None and not e["templates"] & template_bit:
+            continue
+        if regions and regions[-1]["end"] == e["offset"]:
+            regions[-1]["end"] = e["end"]
+        else:
+            regions.append({"offset": e["offset"], "end": e["end"], "base": e.get("base")})
+    last = entries[-1] if entries else {"end": 0}
+    if regions and regions[-1]["end"] == last["end"]:
+        regions[-1]["end"] = None
+    else:
+        regions.append({"offset": last["end"], "end": None, "base": last.get("last")})
+    return regions
+
+
+def read_lines(filename, start=None, end=None, severity=None, template=None):
+    """
+    STREAM THE LINES OF A TEXT LOG FILE THAT ARE IN REGIONS THAT MAY MATCH (SEE find_regions)
+    THE LINES ARE NOT FILTERED: TEXT DOES NOT HAVE THE STRUCTURE TO TELL
+    """
+    with open(filename, "rb") as source:
+        for region in find_regions(filename, start, end, severity, template):
+            source.seek(region["offset"])
+            remaining = None if region["end"] is None else region["end"] - region["offset"]
+            while remaining is None or remaining > 0:
+                # ONE LINE AT A TIME; A REGION CAN BE GIGABYTES
+                line = source.readline() if remaining is None else source.readline(remaining)
+                if not line:
+                    break
+                if remaining is not None:
+                    remaining -= len(line)
+                yield line.rstrip(b"\r\n").decode("utf8")
+
+
+def matches(params, start=None, end=None, severity=None, template=None):
+    """
+    :return: True IF THE RECORD MATCHES THE QUERY (SEE find_regions)
+    """
+    if start is not None or end is not None:
+        timestamp = _seconds(params.get("timestamp"))
+        if start is not None and timestamp < _seconds(start):
+            return False
+        if end is not None and timestamp >= _seconds(end):
+            return False
+    if severity is not None and SEVERITY_LEVEL.get(params.get("severity"), 0) < SEVERITY_LEVEL[severity.upper()]:
+        return False
+    if template is not None and params.get("template") != template:
+        return False
+    return True
+
+
+def _severity_mask(severity):
+    if severity is None:
+        return -1
+    level = SEVERITY_LEVEL[severity.upper()]
+    return OTHER_BIT | sum(bit for s, bit in SEVERITY_BIT.items() if SEVERITY_LEVEL[s] >= level)
+
+
+def _seconds(value):
+    if value is None:
+        return 0
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            return (value - EPOCH).total_seconds()
+        return value.timestamp()
+    return float(value)
@@ -0,0 +1,50 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+class Lazy:
+    """
+    A LOG PARAMETER THAT IS COMPUTED ONLY WHEN THE LOG RECORD IS SERIALIZED
+    THE FUNCTION IS USUALLY CALLED ONCE, ON THE LOGGING THREAD; THERE IS NO LOCK, SO TWO THREADS
+    SERIALIZING THE SAME RECORD AT THE SAME MOMENT MAY BOTH CALL IT (AND ONE RESULT IS KEPT)
+
+        logger.info("{num} rows", num=Lazy(lambda: len(rows)))
+    """
+
+    __slots__ = ["func", "value"]
+
+    def __init__(self, func):
+        self.func = func
+        self.value = None
+
+    def get(self):
+        func = self.func
+        if func is not None:
+            # NO LOCK: func MAY RESOLVE OTHER Lazy VALUES, AND SINKS SHOULD NOT WAIT ON EACH OTHER
+            value = func()
+            if self.func is not None:
+                self.value = value
+                self.func = None
+        return self.value
+
+    def __getitem__(self, item):
+        # ALLOW PATHS INTO THE VALUE, LIKE {data.name}
+        return self.get()[item]
+
+    def __data__(self):
+        # FOR THE JSON ENCODERS
+        return self.get()
+
+
+def resolve(value):
+    """
+    RETURN THE ACTUAL VALUE, IF value IS Lazy
+    """
+    if value.__class__ is Lazy:
+        return value.get()
+    return value
@@ -0,0 +1,161 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import asyncio
+import inspect
+import sys
+from collections import deque
+from weakref import WeakSet
+
+from mo_logs.log_usingNothing import StructuredLogger
+
+MAX_QUEUE = 10000
+STOP_TIMEOUT = 30  # MOST SECONDS stop() WAITS FOR A LOOP IN ANOTHER THREAD
+
+_all = WeakSet()  # EVERY StructuredLogger_usingAsync, FOR flush()
+
+
+class AsyncStructuredLogger:
+    """
+    ABSTRACT BASE CLASS FOR LOGGERS THAT await THEIR WRITES (eg AN asyncio NETWORK CLIENT)
+    GIVE ONE TO logger.start(logs=...), OR WRAP IT IN StructuredLogger_usingAsync
+    """
+
+    async def write_many(self, records):
+        """
+        :param records: LIST OF (template, params) PAIRS
+        """
+        pass
+
+    async def stop(self):
+        pass
+
+
+class StructuredLogger_usingAsync(StructuredLogger):
+    """
+    SEND RECORDS TO logger ON AN asyncio EVENT LOOP, INSTEAD OF A THREAD
+    RECORDS WRITTEN DURING ONE TURN OF THE LOOP ARE SENT AS ONE BATCH, AND ONE BATCH IS SENT AT A TIME
+    logger IS EITHER AN AsyncStructuredLogger (WHICH IS awaited), OR A StructuredLogger (WHICH IS CALLED
+    ON THE LOOP, SO SHOULD NOT BLOCK)
+    """
+
+    def __init__(self, logger, loop=None, max_size=MAX_QUEUE):
+        """
+        :param logger: THE LOGGER TO SEND RECORDS TO
+        :param loop: THE EVENT LOOP TO RUN ON (default THE RUNNING LOOP)
+        :param max_size: MAXIMUM NUMBER OF RECORDS WAITING; THE OLDEST ARE DROPPED
+        """
+        self.logger = logger
+        self.loop = loop or asyncio.get_running_loop()
+        self.pending = deque()
+        self.max_size = max_size
+        self.sending = None  # THE TASK SENDING pending, IF ANY
+        # METRICS
+        self.batches = 0
+        self.records = 0
+        self.dropped = 0
+        self.errors = 0
+        _all.add(self)
+
+    def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        if _running_loop() is self.loop:
+            self._add(records)
+        else:
+            self.loop.call_soon_threadsafe(self._add, list(records))
+
+    def _add(self, records):
+        # ONLY ON THE LOOP, SO NO LOCK
+        pending = self.pending
+        for record in records:
+            if len(pending) >= self.max_size:
+                pending.popleft()
+                self.dropped += 1
+            pending.append(record)
+        if not self.sending:
+            self.sending = self.loop.create_task(self._send())
+
+    async def _send(self):
+        pending = self.pending
+        try:
+            while pending:
+                records = list(pending)
+                pending.clear()
+                try:
+                    result = self.logger.write_many(records)
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as cause:
+                    self.errors += 1
+                    sys.stderr.write(f"problem in {StructuredLogger_usingAsync.__name__}: {cause}\n")
+                self.batches += 1
+                self.records += len(records)
+        finally:
+            self.sending = None
+
+    async def flush(self):
+        """
+        WAIT FOR THE WAITING RECORDS TO BE SENT
+        """
+        while self.sending:
+            await asyncio.shield(self.sending)
+
+    async def _stop(self):
+        await self.flush()
+        result = self.logger.stop()
+        if inspect.isawaitable(result):
+            await result
+
+    def stop(self):
+        loop = self.loop
+        if loop.is_closed():
+            return
+        if _running_loop() is loop:
+            # CAN NOT BLOCK THE LOOP; await flush() FIRST, TO BE SURE NOTHING IS LOST
+            loop.create_task(self._stop())
+        elif loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._stop(), loop).result(STOP_TIMEOUT)
+        else:
+            loop.run_until_complete(self._stop())
+
+    @property
+    def stats(self):
+        """
+        :return: BATCHES AND RECORDS SENT, AND RECORDS WAITING, dropped, OR LOST TO errors
+        """
+        return {
+            "batches": self.batches,
+            "records": self.records,
+            "mean_batch": self.records / self.batches if self.batches else 0,
+            "queue": len(self.pending),
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+
+async def flush():
+    """
+    WAIT FOR EVERY StructuredLogger_usingAsync ON THE RUNNING LOOP TO SEND ITS RECORDS
+    (SENDING TO ONE MAY WRITE TO ANOTHER, SO REPEAT UNTIL NONE ARE SENDING)
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        sending = [a.sending for a in list(_all) if a.loop is loop and a.sending]
+        if not sending:
+            return
+        await asyncio.gather(*(asyncio.shield(s) for s in sending))
+
+
+def _running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
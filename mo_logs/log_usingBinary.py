@@ -0,0 +1,102 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+
+from mo_future import allocate_lock
+from mo_kwargs import override
+
+from mo_logs.binary import MAGIC, Encoder
+from mo_logs.index import EXTENSION as INDEX_EXTENSION, IndexWriter
+from mo_logs.log_usingNothing import StructuredLogger
+
+BUFFER_SIZE = 64 * 1024
+
+
+class StructuredLogger_usingBinary(StructuredLogger):
+    """
+    WRITE RECORDS IN THE COMPACT BINARY FORMAT (SEE mo_logs.binary)
+    EACH TEMPLATE, KEY AND COMMON VALUE IS WRITTEN ONCE; READ WITH python -m mo_logs.binary
+    """
+
+    @override("settings")
+    def __init__(self, file, index=False, index_period=60, settings=None):
+        """
+        :param file: NAME OF THE FILE; AN EXISTING FILE IS BACKED UP, BECAUSE ITS DICTIONARY IS NOT KNOWN
+        :param index: MAINTAIN A SIDECAR INDEX (file.idx) OF TIME, SEVERITY AND TEMPLATE (SEE mo_logs.index)
+        :param index_period: MOST SECONDS COVERED BY ONE INDEX ENTRY
+        """
+        assert file
+        self.index = index
+        self.index_period = index_period
+        self.lock = allocate_lock()
+        self._open(file)
+
+    def _open(self, filename):
+        from mo_files import File
+
+        self.file = file = File(filename)
+        if file.exists:
+            file.backup()
+            file.delete()
+        elif not file.parent.exists:
+            file.parent.create()
+        index_file = File(file.os_path + INDEX_EXTENSION)
+        if index_file.exists:
+            index_file.delete()
+        self.encoder = Encoder()
+        self.buffer = bytearray()
+        self.handle = open(file.os_path, "ab", buffering=BUFFER_SIZE)
+        self.handle.write(MAGIC)
+        self.handle.flush()
+        self.size = len(MAGIC)
+        self.indexer = IndexWriter(file.os_path, self.index_period) if self.index else None
+
+    def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        if not records:
+            return
+        with self.lock:
+            if not self.handle:
+                return
+            buffer = self.buffer
+            base = self.encoder.last_timestamp
+            if self.indexer and self.indexer.starts_bucket(self.size, records):
+                # A READER MAY START HERE, SO REPEAT ALL FIELDS
+                self.encoder.last_fields = {}
+            for template, params in records:
+                self.encoder.encode(template, params, buffer)
+            self.handle.write(buffer)
+            self.handle.flush()
+            offset, self.size = self.size, self.size + len(buffer)
+            buffer.clear()
+            if self.indexer:
+                self.indexer.add(offset, self.size, records, base=base, last=self.encoder.last_timestamp)
+
+    def before_fork(self):
+        self.lock.acquire()
+
+    def after_fork(self, child):
+        if child and self.handle:
+            # THE DICTIONARY IS NOW DIFFERENT IN EACH PROCESS, SO THE CHILD NEEDS ITS OWN FILE (file.<pid>)
+            # THE PARENT FINISHES THE OLD FILE, AND ITS INDEX
+            self.handle.close()
+            self._open(f"{self.file.os_path}.{os.getpid()}")
+        self.lock.release()
+
+    def stop(self):
+        with self.lock:
+            if self.handle:
+                self.handle.close()
+                self.handle = None
+            if self.indexer:
+                self.indexer.close()
+                self.indexer = None
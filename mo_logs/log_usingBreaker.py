@@ -0,0 +1,189 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from collections import deque
+from threading import Timer
+from time import time
+
+from mo_future import allocate_lock
+
+from mo_logs import logger as _logger
+from mo_logs.exceptions import Except
+from mo_logs.log_usingNothing import StructuredLogger
+
+CLOSED = "closed"  # RECORDS ARE SENT
+OPEN = "open"  # RECORDS ARE HELD, UNTIL IT IS TIME TO PROBE
+HALF_OPEN = "half-open"  # ONE BATCH IS SENT TO PROBE IF THE LOGGER HAS RECOVERED
+
+MIN_BACKOFF = 1  # SECONDS BEFORE FIRST PROBE
+MAX_BACKOFF = 5 * 60  # MOST SECONDS BETWEEN PROBES
+MAX_HELD = 1000  # MOST RECORDS HELD WHILE OPEN; OLDEST ARE DROPPED AND COUNTED
+
+
+class StructuredLogger_usingBreaker(StructuredLogger):
+    """
+    CIRCUIT BREAKER FOR A LOGGER THAT MAY FAIL
+    WHEN THE LOGGER RAISES, THE BREAKER OPENS: RECORDS ARE HELD (UP TO max_held), AND THE
+    LOGGER IS PROBED AFTER A BACKOFF THAT DOUBLES WITH EACH FAILED PROBE. ONCE A PROBE
+    SUCCEEDS THE BREAKER CLOSES, AND THE HELD RECORDS ARE SENT. NOTHING WAITS, AND NOTHING RAISES.
+    A TIMER PROBES WITH THE HELD RECORDS, SO THEY ARE SENT EVEN IF NO MORE RECORDS ARRIVE
+
+    A LOGGER WITH ITS OWN write_many() IS SENT WHOLE BATCHES, AND A FAILED BATCH IS HELD WHOLE, SO
+    RECORDS WRITTEN BEFORE THE FAILURE ARE SENT AGAIN (AT-LEAST-ONCE). A LOGGER THAT ONLY HAS write()
+    IS SENT ONE RECORD AT A TIME, AND ONLY THE RECORDS NOT WRITTEN ARE HELD.
+    """
+
+    def __init__(self, logger, min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, max_held=MAX_HELD, clock=time):
+        """
+        :param logger: THE LOGGER THAT MAY FAIL
+        :param min_backoff: SECONDS BEFORE THE FIRST PROBE
+        :param max_backoff: MOST SECONDS BETWEEN PROBES
+        :param max_held: MOST RECORDS HELD WHILE OPEN
+        :param clock: FUNCTION RETURNING THE SECONDS SINCE EPOCH (FOR TESTING)
+        """
+        self.logger = logger
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.lock = allocate_lock()
+        self.state = CLOSED
+        self.backoff = 0
+        self.next_probe = 0
+        self.timer = None
+        self.held = deque(maxlen=max_held)
+        # METRICS
+        self.trips = 0
+        self.recoveries = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        with self.lock:
+            if self.state == OPEN:
+                if self.clock() < self.next_probe:
+                    self._hold(records)
+                    return
+                self.state = HALF_OPEN
+            records = list(self.held) + list(records)
+            self.held.clear()
+
+        # SEND OUTSIDE THE LOCK; THE LOGGER MAY LOG, AND THAT RECORD MAY COME BACK HERE
+        sent, cause = self._send(records)
+
+        with self.lock:
+            state = self.state
+            if cause:
+                self._failure(records[sent:])
+            else:
+                self.state = CLOSED
+                if state == HALF_OPEN:
+                    self.backoff = 0
+                    self.recoveries += 1
+
+        if cause:
+            if state == CLOSED:
+                _logger.warning(
+                    "Logger {type|quote} failed! Will retry in {seconds} seconds",
+                    type=self.logger.__class__.__name__,
+                    seconds=self.backoff,
+                    cause=cause,
+                )
+        elif state == HALF_OPEN:
+            _logger.info("Logger {type|quote} recovered", type=self.logger.__class__.__name__)
+
+    def _hold(self, records):
+        # EXPECT self.lock TO BE HAD
+        for record in records:
+            if len(self.held) == self.held.maxlen:
+                self.dropped += 1
+            self.held.append(record)
+
+    def _failure(self, records):
+        # EXPECT self.lock TO BE HAD
+        self.failures += 1
+        if self.state == CLOSED:
+            self.trips += 1
+            self.backoff = self.min_backoff
+        else:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        self.state = OPEN
+        self.next_probe = self.clock() + self.backoff
+        self._hold(records)
+        if self.timer:
+            self.timer.cancel()
+        self.timer = Timer(self.backoff, self._probe)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _probe(self):
+        with self.lock:
+            self.timer = None
+            if not self.held:
+                # NOTHING TO PROBE WITH; THE NEXT RECORD WILL PROBE
+                return
+        self.write_many([])
+
+    def before_fork(self):
+        self.lock.acquire()
+        if isinstance(self.logger, StructuredLogger):
+            self.logger.before_fork()
+
+    def after_fork(self, child):
+        if isinstance(self.logger, StructuredLogger):
+            self.logger.after_fork(child)
+        if child:
+            # THE PARENT WILL SEND WHAT IS HELD, AND ITS TIMER IS NOT IN THE CHILD
+            self.held.clear()
+            self.timer = None
+        self.lock.release()
+
+    def stop(self):
+        with self.lock:
+            if self.timer:
+                self.timer.cancel()
+                self.timer = None
+            records = list(self.held)
+            self.held.clear()
+        if records:
+            # ONE LAST CHANCE
+            self._send(records)
+        self.logger.stop()
+
+    def _send(self, records):
+        """
+        :return: (NUMBER OF records SENT, Except IF THE REST FAILED)
+        """
+        logger = self.logger
+        sent = 0
+        try:
+            if getattr(logger.__class__, "write_many", StructuredLogger.write_many) is not StructuredLogger.write_many:
+                logger.write_many(records)
+                sent = len(records)
+            else:
+                # ONE AT A TIME, SO WE KNOW WHICH FAILED
+                for template, params in records:
+                    logger.write(template, params)
+                    sent += 1
+            return sent, None
+        except Exception as cause:
+            return sent, Except.wrap(cause)
+
+    @property
+    def stats(self):
+        return {
+            "state": self.state,
+            "trips": self.trips,
+            "recoveries": self.recoveries,
+            "failures": self.failures,
+            "held": len(self.held),
+            "dropped": self.dropped,
+        }
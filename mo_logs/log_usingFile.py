@@ -7,33 +7,323 @@
 #
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
-import time
+import os
+from threading import Timer
+from time import time
 
 from mo_future import allocate_lock
+from mo_kwargs import override
 
 from mo_logs import logger
+from mo_logs.compression import EXTENSIONS, compress_file, new_compressor
+from mo_logs.index import EXTENSION as INDEX_EXTENSION, IndexWriter
 from mo_logs.log_usingNothing import StructuredLogger
-from mo_logs.strings import expand_template
+from mo_logs.render import render
+from mo_logs.strings import CR
+
+NEVER = "never"  # LEAVE IT TO THE OS
+BATCH = "batch"  # fsync AFTER EVERY BATCH
+INTERVAL = "interval"  # fsync AT MOST EVERY fsync_interval SECONDS
+FSYNC_POLICIES = [NEVER, BATCH, INTERVAL]
+
+CHECK_PERIOD = 1  # SECONDS BETWEEN CHECKS FOR AN EXTERNAL RENAME (logrotate)
+BUFFER_SIZE = 64 * 1024
 
 
 class StructuredLogger_usingFile(StructuredLogger):
-    def __init__(self, file):
+    """
+    WRITE EACH BATCH TO AN OPEN FILE, WITH ONE write()
+    ROTATE BY SIZE AND/OR TIME: file IS RENAMED TO file.1, file.1 TO file.2, ... UP TO retention
+    OPTIONALLY COMPRESS AS WRITTEN, OR COMPRESS ROTATED FILES ON ANOTHER THREAD; UNTIL THAT THREAD RENAMES IT,
+    A ROTATED FILE WAITS AS file.rotating.<pid>.<n>
+    """
+
+    @override("settings")
+    def __init__(
+        self,
+        file,
+        max_size=None,
+        interval=None,
+        retention=None,
+        fsync=NEVER,
+        fsync_interval=1,
+        compression=None,
+        compress_rotated=None,
+        level=None,
+        index=False,
+        index_period=60,
+        settings=None,
+    ):
+        """
+        :param file: NAME OF THE FILE
+        :param max_size: ROTATE WHEN FILE WOULD GROW BEYOND THIS MANY BYTES ON DISK (default no limit); A FILE
+                         COMPRESSED AS WRITTEN IS ROTATED AFTER THE BATCH THAT TAKES IT BEYOND max_size
+        :param interval: ROTATE EVERY interval SECONDS, ALIGNED TO THE CLOCK (eg 86400 FOR MIDNIGHT UTC)
+        :param retention: NUMBER OF ROTATED FILES TO KEEP (default keep all)
+        :param fsync: WHEN TO FORCE WRITES TO DISK: never, batch, interval
+        :param fsync_interval: SECONDS BETWEEN fsync, WHEN fsync=="interval"; THE LAST BATCH IS SYNCED
+                               fsync_interval SECONDS LATER, EVEN IF NOTHING MORE IS WRITTEN
+        :param compression: COMPRESS AS WRITTEN: gzip OR zstd (default None); EACH BATCH IS FLUSHED TO
+                            A POINT THE DECOMPRESSOR CAN READ UP TO, SO A CRASH LOSES AT MOST ONE BATCH
+        :param compress_rotated: COMPRESS ROTATED FILES ON ANOTHER THREAD: gzip OR zstd (default None)
+        :param level: COMPRESSION LEVEL
+        :param index: MAINTAIN A SIDECAR INDEX (file.idx) OF TIME, SEVERITY AND TEMPLATE (SEE mo_logs.index)
+        :param index_period: MOST SECONDS COVERED BY ONE INDEX ENTRY
+        """
         assert file
         from mo_files import File
 
+        if fsync not in FSYNC_POLICIES:
+            logger.error(
+                "Expecting fsync to be one of {policies}, not {fsync|quote}", policies=FSYNC_POLICIES, fsync=fsync
+            )
+        if index and compression:
+            logger.error("Can not index a file compressed as written")
+        if compress_rotated and compression:
+            logger.error("Can not compress rotated files that are already compressed as written")
+
         self.file = File(file)
+        self.max_size = max_size
+        self.interval = interval
+        self.retention = retention
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.compression = compression
+        self.compress_rotated = compress_rotated
+        self.level = level
+        self.index = index
+        self.index_period = index_period
+        self.indexer = None
+        self.compressor = None
+        self.compressing = None  # THREAD COMPRESSING THE LAST ROTATED FILE
+        self.rotations = 0
+        for c in (compression, compress_rotated):
+            if c:
+                new_compressor(c, level)  # FAIL EARLY, IF NOT AVAILABLE
+        self.file_lock = allocate_lock()
+        self.handle = None
+        self.size = 0
+        self.inode = None
+        self.next_rotation = None
+        self.next_check = 0
+        self.next_fsync = 0
+        self.timer = None
+
         if self.file.exists:
-            self.file.backup()
-            self.file.delete()
+            if max_size or interval:
+                self._rotate()
+            else:
+                self.file.backup()
+                self.file.delete()
+                _remove(self.filename + INDEX_EXTENSION)
 
-        self.file_lock = allocate_lock()
+    @property
+    def filename(self):
+        return self.file.os_path
 
     def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        if not records:
+            return
+        content = (CR.join(render(template, params) for template, params in records) + CR).encode("utf8")
+        with self.file_lock:
+            now = time()
+            self._check(now)
+            # self.size IS BYTES ON DISK; THE COMPRESSED SIZE OF content IS NOT KNOWN UNTIL IT IS WRITTEN
+            growth = 0 if self.compression else len(content)
+            if self.max_size and self.size and self.size + growth > self.max_size:
+                self._rotate()
+            elif self.next_rotation and now >= self.next_rotation:
+                self._rotate()
+            if not self.handle:
+                self._open(now)
+            if self.compressor:
+                content = self.compressor.compress(content) + self.compressor.flush()
+            self.handle.write(content)
+            self.handle.flush()
+            offset, self.size = self.size, self.size + len(content)
+            if self.indexer:
+                self.indexer.add(offset, self.size, records)
+            if self.fsync == BATCH or (self.fsync == INTERVAL and now >= self.next_fsync):
+                os.fsync(self.handle.fileno())
+                self.next_fsync = now + self.fsync_interval
+            elif self.fsync == INTERVAL and not self.timer:
+                # SO A QUIET LOGGER STILL SYNCS ITS LAST BATCH
+                self.timer = Timer(self.next_fsync - now, self._sync)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def _sync(self):
+        with self.file_lock:
+            self.timer = None
+            if self.handle:
+                os.fsync(self.handle.fileno())
+                self.next_fsync = time() + self.fsync_interval
+
+    def _open(self, now):
+        # EXPECT self.file_lock TO BE HAD
+        if not self.file.parent.exists:
+            self.file.parent.create()
+        self.handle = open(self.filename, "ab", buffering=BUFFER_SIZE)
+        stat = os.fstat(self.handle.fileno())
+        self.size = stat.st_size
+        self.inode = (stat.st_dev, stat.st_ino)
+        if self.compression:
+            self.compressor = new_compressor(self.compression, self.level)
+        if self.index:
+            self.indexer = IndexWriter(self.filename, self.index_period)
+        self.next_check = now + CHECK_PERIOD
+        if self.interval:
+            self.next_rotation = (now // self.interval + 1) * self.interval
+
+    def _close(self):
+        # EXPECT self.file_lock TO BE HAD
+        if not self.handle:
+            return
+        if self.compressor:
+            self.handle.write(self.compressor.finish())
+            self.compressor = None
+        self.handle.flush()
+        if self.fsync != NEVER:
+            os.fsync(self.handle.fileno())
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+        self.handle.close()
+        self.handle = None
+        if self.indexer:
+            self.indexer.close()
+            self.indexer = None
+
+    def _check(self, now):
+        """
+        EXPECT self.file_lock TO BE HAD
+        IF THE FILE WAS RENAMED (OR DELETED) BY ANOTHER PROCESS, START A NEW ONE
+        LINES WRITTEN SINCE THE RENAME ARE IN THE RENAMED FILE
+        """
+        if not self.handle or now < self.next_check:
+            return
+        self.next_check = now + CHECK_PERIOD
         try:
-            with self.file_lock:
-                self.file.append(expand_template(template, params))
-        except Exception as e:
-            logger.warning(
-                "Problem writing to file {file}, waiting...", file=self.file.name, cause=e,
+            stat = os.stat(self.filename)
+            if (stat.st_dev, stat.st_ino) == self.inode:
+                return
+        except FileNotFoundError:
+            pass
+        self._close()
+        # THE INDEX IS FOR THE RENAMED FILE, WHICH WE CAN NOT FIND
+        _remove(self.filename + INDEX_EXTENSION)
+
+    def _rotate(self):
+        # EXPECT self.file_lock TO BE HAD
+        self._close()
+        name = self.filename
+        if self.compress_rotated and self.retention != 0 and os.path.exists(name):
+            # THE WRITER DOES NOT WAIT: A THREAD RENUMBERS THE ROTATED FILES, THEN COMPRESSES, IN ROTATION ORDER
+            self.rotations += 1
+            pending = f"{name}.rotating.{os.getpid()}.{self.rotations}"
+            os.replace(name, pending)
+            # OFFSETS DO NOT APPLY TO THE COMPRESSED FILE
+            _remove(name + INDEX_EXTENSION)
+            from mo_threads import Thread  # ONLY WHEN compress_rotated; mo_threads IS OPTIONAL
+
+            self.compressing = Thread.run(
+                "compress " + name,
+                _compress_rotated,
+                self.compressing,
+                pending,
+                name,
+                self.retention,
+                self.compress_rotated,
+                self.level,
             )
-            time.sleep(5)
+        else:
+            _shift(name, self.retention)
+            if os.path.exists(name):
+                if self.retention == 0:
+                    os.remove(name)
+                    _remove(name + INDEX_EXTENSION)
+                else:
+                    os.replace(name, f"{name}.1")
+                    if os.path.exists(name + INDEX_EXTENSION):
+                        os.replace(name + INDEX_EXTENSION, f"{name}.1{INDEX_EXTENSION}")
+        self.next_rotation = None
+
+    def before_fork(self):
+        self.file_lock.acquire()
+
+    def after_fork(self, child):
+        if child:
+            # THE CHILD APPENDS TO THE SAME FILE, BUT THE INDEX, AND ANY COMPRESSION, BELONG TO THE PARENT
+            self.index = False
+            self.indexer = None
+            self.compressing = None
+            self.timer = None
+        self.file_lock.release()
+
+    def stop(self):
+        with self.file_lock:
+            self._close()
+            if self.compressing:
+                self.compressing.join()
+                self.compressing = None
+
+
+def _compress_rotated(previous, pending, name, retention, compression, level, please_stop):
+    """
+    MAKE pending THE FIRST ROTATED FILE OF name, AND COMPRESS IT
+    :param previous: THE THREAD DOING THE SAME FOR THE ROTATION BEFORE THIS ONE
+    """
+    if previous:
+        previous.join()
+    try:
+        _shift(name, retention)
+        os.replace(pending, f"{name}.1")
+        compress_file(f"{name}.1", compression, level)
+    except Exception as cause:
+        logger.warning("Can not compress {filename|quote}", filename=pending, cause=cause)
+
+
+def _shift(name, retention):
+    """
+    MAKE ROOM FOR A NEW name.1: REMOVE WHAT retention DOES NOT KEEP, AND RENAME name.i TO name.{i+1}
+    """
+    if retention is not None:
+        for i in range(max(retention, 1), _last_rotation(name) + 1):
+            os.remove(_rotated(name, i))
+            _remove(f"{name}.{i}{INDEX_EXTENSION}")
+    for i in reversed(range(1, _last_rotation(name) + 1)):
+        rotated = _rotated(name, i)
+        os.replace(rotated, f"{name}.{i + 1}" + rotated[len(f"{name}.{i}") :])
+        if os.path.exists(f"{name}.{i}{INDEX_EXTENSION}"):
+            os.replace(f"{name}.{i}{INDEX_EXTENSION}", f"{name}.{i + 1}{INDEX_EXTENSION}")
+
+
+def _remove(filename):
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+
+
+def _rotated(name, i):
+    """
+    :return: NAME OF THE i-TH ROTATED FILE, COMPRESSED OR NOT (None IF NONE)
+    """
+    for extension in ["", *EXTENSIONS.values()]:
+        rotated = f"{name}.{i}{extension}"
+        if os.path.exists(rotated):
+            return rotated
+    return None
+
+
+def _last_rotation(name):
+    """
+    :return: LARGEST i WHERE THE i-TH ROTATED FILE EXISTS (0 IF NONE)
+    """
+    i = 0
+    while _rotated(name, i + 1):
+        i += 1
+    return i
@@ -17,8 +17,9 @@ from mo_kwargs import override
 
 from mo_logs.utils import logger, STACKTRACE
 from mo_logs.exceptions import FATAL, ERROR, WARNING, ALARM, UNEXPECTED, INFO, NOTE, format_trace
+from mo_logs.lazy import resolve
 from mo_logs.log_usingNothing import StructuredLogger
-from mo_logs.strings import expand_template
+from mo_logs.render import render
 
 Log = delay_import("mo_logs.Log")
 NO_ARGS = tuple()
@@ -41,7 +42,7 @@ class StructuredLogger_usingHandler(StructuredLogger):
             level=_severity_to_level[params.severity],
             pathname=params.location.file,
             lineno=params.location.line,
-            msg=expand_template(template.replace(STACKTRACE, ""), params),
+            msg=render(template.replace(STACKTRACE, ""), params),
             args=NO_ARGS,
             exc_info=None,
             func=params.location.method,
@@ -52,10 +53,11 @@ class StructuredLogger_usingHandler(StructuredLogger):
         record.process = params.machine.pid
 
         if params.cause or record.levelno >= logging.WARNING:
-            record.exc_text = expand_template(template, params)
+            record.exc_text = render(template, params)
         else:
             record.exc_text = record.msg
         for k, v in params.params.leaves():
+            v = resolve(v)
             if is_missing(v):
                 continue
             if v.__class__.__name__ == "Date":
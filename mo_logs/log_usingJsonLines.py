@@ -0,0 +1,241 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import base64
+import math
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from json.encoder import encode_basestring
+
+from mo_dots import from_data
+from mo_future import allocate_lock, STDOUT
+from mo_json import value2json
+from mo_kwargs import override
+
+from mo_logs.lazy import Lazy
+from mo_logs.log_usingNothing import StructuredLogger
+
+try:
+    import orjson
+except Exception:
+    orjson = None
+
+EPOCH = datetime(1970, 1, 1)
+SKIP = {"trace_text", "cause_text"}  # TEXT RENDERINGS OF trace AND cause, WHICH ARE ALREADY INCLUDED
+KEY_ORDER = ["timestamp", "severity", "template", "params", "cause", "trace", "location", "thread", "machine"]
+KEYS = {k: encode_basestring(k) + ":" for k in KEY_ORDER}  # PRE-ENCODED
+
+
+class StructuredLogger_usingJsonLines(StructuredLogger):
+    """
+    WRITE EACH RECORD AS ONE LINE OF JSON: THE FULL STRUCTURE, NOT THE EXPANDED TEMPLATE
+    DATES ARE SECONDS SINCE EPOCH
+    """
+
+    @override("settings")
+    def __init__(self, filename=None, stream=None, fast=True, settings=None):
+        """
+        :param filename: APPEND TO THIS FILE
+        :param stream: OR WRITE TO THIS BINARY STREAM (default stdout)
+        :param fast: USE orjson, IF INSTALLED (default True)
+        """
+        self.lock = allocate_lock()
+        self.owned = bool(filename)  # CLOSE THE STREAM IN stop(), ONLY IF WE OPENED IT
+        if filename:
+            self.stream = open(filename, "ab")
+        elif stream:
+            self.stream = stream
+        else:
+            self.stream = getattr(STDOUT, "buffer", STDOUT)
+        self.encode = encode_orjson if fast and orjson else encode
+        self.buffer = bytearray()
+
+    def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        if not records:
+            return
+        encode = self.encode
+        with self.lock:
+            buffer = self.buffer
+            for _, params in records:
+                buffer += encode(params)
+            self.stream.write(buffer)
+            self.stream.flush()
+            buffer.clear()
+
+    def before_fork(self):
+        self.lock.acquire()
+
+    def after_fork(self, child):
+        self.lock.release()
+
+    def stop(self):
+        with self.lock:
+            try:
+                self.stream.flush()
+                if self.owned:
+                    self.stream.close()
+            except Exception:
+                pass
+
+
+def encode(record):
+    """
+    :param record: THE params GIVEN TO write()
+    :return: ONE LINE OF JSON (BYTES, WITH TRAILING NEWLINE)
+    """
+    record = from_data(record)
+    output = []
+    append = output.append
+    for k in KEY_ORDER:
+        v = record.get(k)
+        if v is None:
+            continue
+        append(KEYS[k])
+        _encode(v, append)
+        append(",")
+    for k, v in record.items():
+        if k in KEYS or k in SKIP or v is None:
+            continue
+        append(encode_basestring(k) + ":")
+        _encode(v, append)
+        append(",")
+    if output:
+        output[-1] = "}\n"
+    else:
+        output.append("}\n")
+    return ("{" + "".join(output)).encode("utf8")
+
+
+def _encode(value, append):
+    _type = value.__class__
+    if _type is str:
+        append(encode_basestring(value))
+    elif _type is int:
+        append(str(value))
+    elif _type is float:
+        append(repr(value) if math.isfinite(value) else "null")
+    elif _type is datetime:
+        append(repr(_datetime2unix(value)))
+    elif _type is dict:
+        if not value:
+            append("{}")
+            return
+        append("{")
+        first = True
+        for k, v in value.items():
+            if first:
+                first = False
+            else:
+                append(",")
+            append(encode_basestring(k if k.__class__ is str else str(k)))
+            append(":")
+            _encode(v, append)
+        append("}")
+    elif _type is list or _type is tuple:
+        append("[")
+        first = True
+        for v in value:
+            if first:
+                first = False
+            else:
+                append(",")
+            _encode(v, append)
+        append("]")
+    elif value is None or value is True or value is False:
+        append("null" if value is None else "true" if value else "false")
+    elif _type is _Raw:
+        append(str.__str__(value))
+    else:
+        _encode(_default(value), append)
+
+
+def _default(value):
+    """
+    CONVERT UNCOMMON TYPES TO ONES THAT ARE EASY TO ENCODE
+    """
+    if value.__class__ is Lazy:
+        return value.get()
+    elif isinstance(value, bool):
+        return bool(value)
+    elif isinstance(value, int):
+        return int(value)
+    elif isinstance(value, float):
+        return float(value)
+    elif isinstance(value, str):
+        return str(value)
+    elif isinstance(value, datetime):
+        return _datetime2unix(value)
+    elif isinstance(value, date):
+        return _datetime2unix(datetime(value.year, value.month, value.day))
+    elif isinstance(value, timedelta):
+        return value.total_seconds()
+    elif isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, bytes):
+        return base64.b64encode(value).decode("latin1")
+    elif isinstance(value, (set, frozenset)):
+        return list(value)
+    elif hasattr(value.__class__, "__data__"):
+        return from_data(value.__data__())
+    raw = from_data(value)
+    if raw is not value:
+        return raw
+    elif isinstance(value, dict):
+        return dict(value)
+    elif isinstance(value, (list, tuple)):
+        return list(value)
+    # ANYTHING ELSE IS LEFT TO mo_json
+    try:
+        return _Raw(value2json(value))
+    except Exception:
+        return str(value)
+
+
+class _Raw(str):
+    """
+    ALREADY JSON
+    """
+
+    __slots__ = []
+
+
+def _datetime2unix(value):
+    if value.tzinfo is None:
+        return (value - EPOCH).total_seconds()
+    return value.timestamp()
+
+
+def encode_orjson(record):
+    """
+    SAME AS encode(), USING orjson
+    """
+    record = from_data(record)
+    output = {}
+    for k in KEY_ORDER:
+        v = record.get(k)
+        if v is not None:
+            output[k] = v
+    for k, v in record.items():
+        if k not in output and k not in SKIP and v is not None:
+            output[k] = v
+    return orjson.dumps(
+        output,
+        default=_orjson_default,
+        option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+def _orjson_default(value):
+    value = _default(value)
+    if value.__class__ is _Raw:
+        return orjson.loads(str.__str__(value))
+    return value
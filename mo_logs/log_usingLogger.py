@@ -13,7 +13,7 @@ from mo_kwargs import override
 
 from mo_logs import exceptions
 from mo_logs.log_usingNothing import StructuredLogger
-from mo_logs.strings import expand_template
+from mo_logs.render import render
 
 
 # WRAP PYTHON logger OBJECTS
@@ -36,7 +36,7 @@ class StructuredLogger_usingLogger(StructuredLogger):
 
     def write(self, template, params):
         try:
-            log_line = expand_template(template, params)
+            log_line = render(template, params)
             level = max(self.min_level, MAP[params.severity])
             self.logger.log(level, log_line)
             self.count += 1
@@ -17,6 +17,7 @@ from mo_kwargs import override
 
 from mo_logs import logger, strings
 from mo_logs.exceptions import ALARM, ERROR, NOTE, WARNING
+from mo_logs.lazy import resolve
 from mo_logs.log_usingNothing import StructuredLogger
 
 LOG_STRING_LENGTH = 2000
@@ -50,7 +51,9 @@ class StructuredLogger_usingMozLog(StructuredLogger):
             "EnvVersion": "2.0",
             "Severity": severity_map.get(params.severity, 3),  # https://en.wikipedia.org/wiki/Syslog#Severity_levels
             "Pid": params.machine.pid,
-            "Fields": {k: strings.limit(_json_to_string(v), LOG_STRING_LENGTH) for k, v in to_data(params).leaves()},
+            "Fields": {
+                k: strings.limit(_json_to_string(resolve(v)), LOG_STRING_LENGTH) for k, v in to_data(params).leaves()
+            },
         }
         self.stream.write(value2json(output).encode("utf8"))
         self.stream.write(b"\n")
@@ -7,48 +7,98 @@
 #
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
-from mo_logs import logger as _logger
+from mo_dots import from_data
 
-from mo_logs.exceptions import suppress_exception, Except
+from mo_logs import logger as _logger
+from mo_logs.exceptions import suppress_exception
+from mo_logs.log_usingBreaker import StructuredLogger_usingBreaker
 from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.render import RenderMemo
+from mo_logs.utils import _add_thread
 
 
 class StructuredLogger_usingMulti(StructuredLogger):
-    def __init__(self):
+    """
+    SEND RECORDS TO MANY LOGGERS
+    EACH LOGGER IS BEHIND A CIRCUIT BREAKER, SO A FAILING LOGGER IS RETRIED LATER, NOT REMOVED
+    """
+
+    def __init__(self, fan_out=False, queue=None, breaker=None):
+        """
+        :param fan_out: GIVE EACH LOGGER ITS OWN QUEUE AND THREAD, SO A SLOW LOGGER DOES NOT HOLD UP THE REST
+                        (default False, WHICH WRITES TO EACH LOGGER IN TURN)
+        :param queue: SETTINGS FOR EACH LOGGER'S QUEUE, WHEN fan_out (SEE StructuredLogger_usingThread)
+        :param breaker: SETTINGS FOR EACH LOGGER'S CIRCUIT BREAKER (SEE StructuredLogger_usingBreaker)
+        """
+        self.fan_out = fan_out
+        self.queue = queue
+        self.breaker = breaker
         self.many = []
+        self.breakers = {}  # MAP FROM id(logger) TO ITS CIRCUIT BREAKER
+        self.threads = {}  # MAP FROM id(logger) TO THE THREAD THAT FEEDS ITS BREAKER, WHEN fan_out
 
     def write(self, template, params):
-        bad = []
-        for m in self.many:
-            try:
-                m.write(template, params)
-            except Exception as e:
-                e = Except.wrap(e)
-                bad.append(m)
-                _logger.warning(
-                    "Logger {type|quote} failed! It will be removed.", type=m.__class__.__name__, cause=e,
-                )
-        with suppress_exception:
-            for b in bad:
-                self.many.remove(b)
+        return self.write_many([(template, params)])
 
+    def write_many(self, records):
+        with RenderMemo():
+            for m in self.many:
+                i = id(m)
+                self.threads.get(i, self.breakers[i]).write_many(records)
         return self
 
     def add_log(self, logger):
         if logger == None:
             _logger.warning("Expecting a non-None logger")
 
+        breaker = self.breakers[id(logger)] = StructuredLogger_usingBreaker(logger, **(from_data(self.breaker) or {}))
+        if self.fan_out:
+            self.threads[id(logger)] = _add_thread(breaker, self.queue)
         self.many.append(logger)
         return self
 
     def remove_log(self, logger):
         self.many.remove(logger)
+        self.breakers.pop(id(logger), None)
+        thread = self.threads.pop(id(logger), None)
+        if thread:
+            thread.stop()
         return self
 
     def clear_log(self):
+        for thread in self.threads.values():
+            with suppress_exception:
+                thread.stop()
+        self.breakers = {}
+        self.threads = {}
         self.many = []
 
+    def before_fork(self):
+        for m in self.many:
+            i = id(m)
+            self.threads.get(i, self.breakers[i]).before_fork()
+
+    def after_fork(self, child):
+        for m in self.many:
+            i = id(m)
+            self.threads.get(i, self.breakers[i]).after_fork(child)
+
     def stop(self):
         for m in self.many:
             with suppress_exception:
-                m.stop()
+                i = id(m)
+                self.threads.get(i, self.breakers[i]).stop()
+
+    @property
+    def stats(self):
+        """
+        :return: CIRCUIT BREAKER STATISTICS FOR EACH LOGGER, WITH BATCH, LATENCY AND LOSS STATISTICS WHEN fan_out
+        """
+        return [
+            {
+                "type": m.__class__.__name__,
+                "breaker": self.breakers[id(m)].stats,
+                **getattr(self.threads.get(id(m)), "stats", {}),
+            }
+            for m in self.many
+        ]
@@ -15,6 +15,27 @@ class StructuredLogger:
     def write(self, template, params):
         pass
 
+    def write_many(self, records):
+        """
+        :param records: LIST OF (template, params) PAIRS; OVERRIDE TO HANDLE THE WHOLE BATCH AT ONCE
+        """
+        for template, params in records:
+            self.write(template, params)
+
+    def before_fork(self):
+        """
+        CALLED JUST BEFORE os.fork(): ACQUIRE LOCKS, SO NO OTHER THREAD IS PART WAY THROUGH A WRITE
+        """
+        pass
+
+    def after_fork(self, child):
+        """
+        CALLED JUST AFTER os.fork(), IN BOTH PROCESSES: RELEASE WHAT before_fork() ACQUIRED
+        :param child: True IN THE CHILD, WHERE ONLY THE FORKING THREAD SURVIVES: DROP WHAT THE PARENT
+                      STILL OWNS (QUEUED RECORDS, BUFFERS) AND START NEW WORKER THREADS
+        """
+        pass
+
     def stop(self):
         pass
 
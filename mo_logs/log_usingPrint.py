@@ -10,7 +10,8 @@
 from mo_future import allocate_lock
 
 from mo_logs.log_usingNothing import StructuredLogger
-from mo_logs.strings import expand_template
+from mo_logs.render import render
+from mo_logs.strings import CR
 
 
 class StructuredLogger_usingPrint(StructuredLogger):
@@ -18,6 +19,19 @@ class StructuredLogger_usingPrint(StructuredLogger):
         self.locker = allocate_lock()
 
     def write(self, template, params):
-        value = expand_template(template, params)
+        value = render(template, params)
         with self.locker:
             print(value)
+
+    def write_many(self, records):
+        if not records:
+            return
+        value = CR.join(render(template, params) for template, params in records)
+        with self.locker:
+            print(value)
+
+    def before_fork(self):
+        self.locker.acquire()
+
+    def after_fork(self, child):
+        self.locker.release()
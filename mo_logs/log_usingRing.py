@@ -0,0 +1,111 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+
+from mo_dots import from_data
+from mo_future import allocate_lock
+from mo_kwargs import override
+
+from mo_logs.lazy import Lazy
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.ring import Ring, encode
+from mo_logs.utils import ChainedParams
+
+DEFAULT_SIZE = 1024 * 1024
+NOT_RESOLVED = "(Lazy, not resolved)"  # WRITTEN TO THE RING INSTEAD OF A Lazy VALUE
+
+
+class StructuredLogger_usingRing(StructuredLogger):
+    """
+    COPY EVERY RECORD TO A CRASH RING (SEE mo_logs.ring), IN THE CALLER'S THREAD, THEN SEND TO logger
+    PUT IN FRONT OF THE LOGGING THREAD, SO RECORDS STILL IN ITS QUEUE SURVIVE A CRASH
+    THE CALLER PAYS FOR ENCODING, SO ONLY THE params OF THE LOG CALL ARE COPIED: NOT THE extras, AND
+    Lazy VALUES ARE NOT RESOLVED (SEE _cheap())
+    RECOVER WITH python -m mo_logs.ring
+    """
+
+    @override("settings")
+    def __init__(self, file, size=DEFAULT_SIZE, logger=None, settings=None):
+        """
+        :param file: NAME OF THE RING FILE
+        :param size: BYTES TO KEEP (default 1M)
+        :param logger: THE StructuredLogger TO SEND RECORDS TO, AFTER (default None)
+        """
+        assert file
+        from mo_files import File
+
+        file = File(file)
+        if not file.parent.exists:
+            file.parent.create()
+        self.filename = file.os_path
+        self.ring = Ring(self.filename, size)
+        self.lock = allocate_lock()
+        self.logger = logger
+        self.records = 0
+
+    def write(self, template, params):
+        payload = encode(template, _cheap(params))
+        with self.lock:
+            self.ring.append(payload)
+            self.records += 1
+        if self.logger:
+            self.logger.write(template, params)
+
+    def write_many(self, records):
+        payloads = [encode(template, _cheap(params)) for template, params in records]
+        with self.lock:
+            for payload in payloads:
+                self.ring.append(payload)
+            self.records += len(payloads)
+        if self.logger:
+            self.logger.write_many(records)
+
+    def before_fork(self):
+        self.lock.acquire()
+        if self.logger:
+            self.logger.before_fork()
+
+    def after_fork(self, child):
+        if self.logger:
+            self.logger.after_fork(child)
+        if child:
+            # THE MEMORY IS SHARED WITH THE PARENT, SO THE CHILD NEEDS ITS OWN RING (file.<pid>)
+            self.ring.close()
+            self.ring = Ring(f"{self.filename}.{os.getpid()}", self.ring.capacity)
+        self.lock.release()
+
+    @property
+    def stats(self):
+        """
+        :return: STATS OF logger, PLUS THOSE OF THE RING
+        """
+        output = dict(getattr(self.logger, "stats", None) or {})
+        output["ring"] = {"records": self.records, "size": self.ring.capacity, "sequence": self.ring.sequence}
+        return output
+
+    def stop(self):
+        if self.logger:
+            self.logger.stop()
+        with self.lock:
+            self.ring.close()
+
+
+def _cheap(record):
+    """
+    :return: COPY OF record WITH ONLY THE params OF THE LOG CALL (NOT THE extras), AND NO Lazy VALUES
+    """
+    record = from_data(record)
+    params = record.get("params")
+    if params.__class__ is ChainedParams:
+        params = params.own
+    output = {k: v for k, v in record.items() if k != "params"}
+    if params:
+        output["params"] = {k: NOT_RESOLVED if v.__class__ is Lazy else v for k, v in from_data(params).items()}
+    return output
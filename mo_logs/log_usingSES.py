@@ -67,6 +67,15 @@ class StructuredLogger_usingSES(StructuredLogger):
             if Date.now() > self.next_send:
                 self._send_email()
 
+    def before_fork(self):
+        self.locker.lock.acquire()
+
+    def after_fork(self, child):
+        if child:
+            # THE PARENT WILL SEND WHAT IS ACCUMULATED
+            self.accumulation = []
+        self.locker.lock.release()
+
     def stop(self):
         with self.locker:
             self._send_email()
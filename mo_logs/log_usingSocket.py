@@ -0,0 +1,145 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import socket
+import sys
+from collections import deque
+
+from mo_dots import from_data
+from mo_future import allocate_lock
+from mo_kwargs import override
+
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.ring import encode
+
+MAX_DATAGRAM = 60_000  # MOST BYTES SENT AT ONCE
+MAX_SPILL = 10_000  # MOST DATAGRAMS HELD WHILE THE AGGREGATOR IS NOT LISTENING
+TOO_BIG = "{params.severity}: Record of {params.size} bytes is too big to send: {params.template|quote}"
+
+
+class StructuredLogger_usingSocket(StructuredLogger):
+    """
+    SEND RECORDS TO AN AGGREGATOR (SEE mo_logs.aggregate), OVER A UNIX DATAGRAM SOCKET
+    ONE DATAGRAM PER BATCH (OR PART OF A BATCH); NEVER BLOCKS: IF THE AGGREGATOR IS NOT KEEPING UP (OR NOT
+    LISTENING) DATAGRAMS ARE HELD IN A SPILL BUFFER, AND SENT FIRST NEXT TIME
+    """
+
+    @override("settings")
+    def __init__(self, address, max_spill=MAX_SPILL, settings=None):
+        """
+        :param address: PATH OF THE AGGREGATOR'S SOCKET
+        :param max_spill: MOST DATAGRAMS TO HOLD; THE OLDEST ARE DROPPED
+        """
+        self.address = address
+        self.max_spill = max_spill
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.setblocking(False)
+        self.spill = deque()
+        self.lock = allocate_lock()
+        # METRICS
+        self.sent = 0
+        self.spilled = 0
+        self.dropped = 0
+
+    def write(self, template, params):
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        datagrams = _pack([_encode(template, params) for template, params in records])
+        with self.lock:
+            spill = self.spill
+            if spill:
+                self._send_spill()
+            for i, datagram in enumerate(datagrams):
+                if spill or not self._send(datagram):
+                    self._hold(datagrams[i:])
+                    break
+
+    def _send(self, datagram):
+        # EXPECT self.lock TO BE HAD
+        try:
+            self.socket.sendto(datagram, self.address)
+            self.sent += 1
+            return True
+        except OSError:
+            # NOT LISTENING, OR FULL
+            return False
+
+    def _send_spill(self):
+        # EXPECT self.lock TO BE HAD
+        spill = self.spill
+        while spill and self._send(spill[0]):
+            spill.popleft()
+
+    def _hold(self, datagrams):
+        # EXPECT self.lock TO BE HAD
+        spill = self.spill
+        spill.extend(datagrams)
+        self.spilled += len(datagrams)
+        while len(spill) > self.max_spill:
+            spill.popleft()
+            self.dropped += 1
+
+    def before_fork(self):
+        self.lock.acquire()
+
+    def after_fork(self, child):
+        if child:
+            # THE PARENT WILL SEND WHAT IS HELD
+            self.spill.clear()
+        self.lock.release()
+
+    @property
+    def stats(self):
+        """
+        :return: DATAGRAMS sent, spilled (HELD FOR LATER), dropped (SPILL WAS FULL), AND held NOW
+        """
+        return {"sent": self.sent, "spilled": self.spilled, "dropped": self.dropped, "held": len(self.spill)}
+
+    def stop(self):
+        with self.lock:
+            self._send_spill()
+            if self.spill:
+                sys.stderr.write(f"{len(self.spill)} batches of log records not sent to {self.address}\n")
+            self.socket.close()
+
+
+def _encode(template, params):
+    payload = encode(template, params)
+    if len(payload) <= MAX_DATAGRAM:
+        return payload
+    params = from_data(params)
+    return encode(
+        TOO_BIG,
+        {
+            "severity": params.get("severity"),
+            "timestamp": params.get("timestamp"),
+            "template": "{{severity}}: Record of {{size}} bytes is too big to send: {{template|quote}}",
+            "params": {"severity": params.get("severity"), "size": len(payload), "template": template[:1000]},
+        },
+    )
+
+
+def _pack(payloads):
+    """
+    :return: DATAGRAMS: ONE PAYLOAD PER LINE, AS MANY AS FIT
+    """
+    output = []
+    datagram = []
+    size = 0
+    for payload in payloads:
+        if datagram and size + len(payload) + 1 > MAX_DATAGRAM:
+            output.append(b"\n".join(datagram))
+            datagram = []
+            size = 0
+        datagram.append(payload)
+        size += len(payload) + 1
+    if datagram:
+        output.append(b"\n".join(datagram))
+    return output
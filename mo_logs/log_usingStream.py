@@ -8,53 +8,108 @@
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
 from mo_future import allocate_lock, STDERR, STDOUT
+from mo_kwargs import override
 
 from mo_logs.log_usingNothing import StructuredLogger
-from mo_logs.strings import CR, expand_template
+from mo_logs.render import render
+from mo_logs.strings import CR
+
+BUFFER_SIZE = 64 * 1024  # WRITE WHEN THIS MANY BYTES ARE BUFFERED
+MAX_LATENCY = 1  # WRITE WHEN BYTES HAVE BEEN BUFFERED THIS MANY SECONDS
 
 
 class StructuredLogger_usingStream(StructuredLogger):
-    def __init__(self, stream):
+    """
+    WRITE UTF8 LINES TO A BINARY STREAM (OR STDOUT/STDERR), WITH ONE write() AND ONE flush() PER BATCH
+    WHEN buffered, BYTES ARE HELD UNTIL buffer_size OR max_latency IS REACHED, UNLESS THE STREAM IS A TTY
+    """
+
+    @override("settings")
+    def __init__(self, stream, buffered=False, buffer_size=BUFFER_SIZE, max_latency=MAX_LATENCY, settings=None):
+        """
+        :param stream: WHERE TO WRITE
+        :param buffered: HOLD BYTES ACROSS BATCHES (IGNORED IF stream IS A TTY, WHICH GETS EVERY BATCH IMMEDIATELY)
+        :param buffer_size: WHEN buffered, WRITE WHEN THIS MANY BYTES ARE HELD
+        :param max_latency: WHEN buffered, WRITE WHEN BYTES HAVE BEEN HELD THIS MANY SECONDS
+        """
         try:
             self.locker = allocate_lock()
-            self.flush = stream.flush
             if stream in (STDOUT, STDERR):
                 try:
+                    stream.flush()
                     stream = stream.buffer
                 except Exception:
                     # SOMETIMES STDOUT IS REPLACED BY SOMETHING ELSE
                     pass
-            self.writer = _UTF8Encoder(stream).write
+            self.stream = stream
+            self.buffered = buffered and not _is_tty(stream)
+            self.buffer_size = buffer_size
+            self.max_latency = max_latency
+            self.buffer = bytearray()
+            self.timer = None
         except Exception as _:
             import sys
 
             sys.stderr.write("can not handle")
 
     def write(self, template, params):
-        value = expand_template(template, params)
+        self.write_many([(template, params)])
+
+    def write_many(self, records):
+        if not records:
+            return
+        value = "".join(render(template, params) + CR for template, params in records).encode("utf8")
         with self.locker:
-            self.writer(value + CR)
-            try:
-                self.flush()
-            except Exception:
-                pass
+            if not self.buffered:
+                self._write(value)
+                return
+            self.buffer += value
+            if len(self.buffer) >= self.buffer_size:
+                self._flush()
+            elif not self.timer:
+                from mo_threads import Till  # ONLY WHEN buffered; mo_threads IS OPTIONAL
 
-    def stop(self):
-        try:
-            self.flush()
-        except Exception:
-            pass
+                self.timer = Till(seconds=self.max_latency)
+                self.timer.then(self._flush_late)
 
+    def _flush_late(self):
+        with self.locker:
+            self._flush()
 
-class _UTF8Encoder:
-    def __init__(self, stream):
-        self.stream = stream
+    def _flush(self):
+        # EXPECT self.locker TO BE HAD
+        self.timer = None
+        if self.buffer:
+            self._write(self.buffer)
+            self.buffer.clear()
 
-    def write(self, v):
+    def _write(self, value):
+        # EXPECT self.locker TO BE HAD
         try:
-            self.stream.write(v.encode("utf8"))
+            self.stream.write(value)
             self.stream.flush()
         except Exception:
             import sys
 
             sys.stderr.write("can not handle")
+
+    def before_fork(self):
+        self.locker.acquire()
+
+    def after_fork(self, child):
+        if child:
+            # THE PARENT WILL WRITE WHAT IS BUFFERED
+            self.buffer.clear()
+            self.timer = None
+        self.locker.release()
+
+    def stop(self):
+        with self.locker:
+            self._flush()
+
+
+def _is_tty(stream):
+    try:
+        return stream.isatty()
+    except Exception:
+        return False
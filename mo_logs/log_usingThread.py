@@ -7,69 +7,337 @@
 #
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
-from mo_threads import Queue, THREAD_STOP, Thread, Till
+from time import time
+
+from mo_dots import from_data, dict_to_data
+from mo_future import utcnow
+from mo_threads import Queue, Signal, THREAD_STOP, Thread, Till
 
 from mo_logs import Except, Log
+from mo_logs.exceptions import SEVERITY_LEVEL, WARNING, ERROR, LogItem
 from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.utils import ChainedParams
 
 DEBUG = False
-PERIOD = 0.3
+PERIOD = 0.3  # MAXIMUM SECONDS A RECORD WAITS IN QUEUE, WHEN TRAFFIC IS LIGHT
+MAX_BATCH = 1000  # FLUSH IMMEDIATELY WHEN THIS MANY RECORDS ARE WAITING
+MAX_QUEUE = 10000
+URGENT_LEVEL = SEVERITY_LEVEL[WARNING]  # FLUSH IMMEDIATELY AT THIS SEVERITY, OR ABOVE
+REPORT_PERIOD = 60  # MINIMUM SECONDS BETWEEN "MESSAGES DROPPED" RECORDS
+RECORD_OVERHEAD = 500  # ESTIMATED BYTES FOR A RECORD, NOT INCLUDING TEMPLATE AND STRING PARAMETERS
+
+# OVERFLOW POLICIES, FOR WHEN THE QUEUE IS FULL
+BLOCK = "block"  # CALLER WAITS FOR SPACE
+DROP_NEWEST = "drop-newest"  # NEW RECORD IS DROPPED
+DROP_OLDEST = "drop-oldest"  # OLDEST WAITING RECORD IS DROPPED
+DROP_BELOW_SEVERITY = "drop-below-severity"  # NEW RECORD IS DROPPED, UNLESS IT IS keep_severity OR WORSE
+OVERFLOW_POLICIES = [BLOCK, DROP_NEWEST, DROP_OLDEST, DROP_BELOW_SEVERITY]
+
+DROP_TEMPLATE = "{params.num} log messages dropped by {params.policy} policy"
 
 
 class StructuredLogger_usingThread(StructuredLogger):
-    def __init__(self, logger, period=PERIOD):
+    """
+    SEND RECORDS TO logger ON A SEPARATE THREAD
+    RECORDS ARE COALESCED FOR UP TO max_latency SECONDS, UNLESS max_batch RECORDS
+    ARE WAITING, OR A WARNING (OR WORSE) ARRIVES, WHICH ARE FLUSHED IMMEDIATELY
+    """
+
+    def __init__(
+        self,
+        logger,
+        period=PERIOD,
+        max_latency=None,
+        max_batch=MAX_BATCH,
+        overflow=BLOCK,
+        max_size=MAX_QUEUE,
+        max_bytes=None,
+        keep_severity=ERROR,
+        report_period=REPORT_PERIOD,
+    ):
+        """
+        :param logger: THE StructuredLogger TO SEND RECORDS TO
+        :param period: DEPRECATED, USE max_latency
+        :param max_latency: MAXIMUM SECONDS A RECORD WAITS TO BE BATCHED WITH OTHERS
+        :param max_batch: SEND IMMEDIATELY WHEN THIS MANY RECORDS ARE WAITING
+        :param overflow: WHAT TO DO WHEN QUEUE IS FULL: block, drop-newest, drop-oldest, drop-below-severity
+        :param max_size: MAXIMUM NUMBER OF RECORDS WAITING
+        :param max_bytes: MAXIMUM (ESTIMATED) BYTES OF RECORDS WAITING (default no limit)
+        :param keep_severity: FOR drop-below-severity, RECORDS OF THIS SEVERITY (OR WORSE) ARE NEVER DROPPED
+        :param report_period: MINIMUM SECONDS BETWEEN "MESSAGES DROPPED" RECORDS
+        """
         if not isinstance(logger, StructuredLogger):
             logger.error("Expecting a StructuredLogger")
+        if overflow not in OVERFLOW_POLICIES:
+            Log.error(
+                "Expecting overflow to be one of {policies}, not {overflow|quote}",
+                policies=OVERFLOW_POLICIES,
+                overflow=overflow,
+            )
 
         self.logger = logger
-        self.queue = Queue("Queue for " + self.__class__.__name__, max=10000, silent=True, allow_add_after_close=True,)
-        self.thread = Thread("Thread for " + self.__class__.__name__, worker, logger, self.queue, period)
+        self.max_latency = period if max_latency is None else max_latency
+        self.max_batch = max_batch
+        self.overflow = overflow
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.keep_level = SEVERITY_LEVEL[keep_severity.upper()]
+        self.report_period = report_period
+        self.wake = Signal()
+        self.queued_bytes = 0
+        # METRICS
+        self.batches = 0
+        self.records = 0
+        self.largest_batch = 0
+        self.total_latency = 0
+        self.max_seen_latency = 0
+        self.blocked = 0
+        self.blocked_seconds = 0
+        self.errors = 0
+        self.dropped = {p: 0 for p in OVERFLOW_POLICIES if p != BLOCK}
+        self.unreported = 0
+        self.next_report = 0
+
+        self._start()
+
+    def _start(self):
+        self.queue = Queue(
+            "Queue for " + self.__class__.__name__, max=self.max_size, silent=True, allow_add_after_close=True,
+        )
+        self.thread = Thread("Thread for " + self.__class__.__name__, self._worker)
         # worker WILL BE RESPONSIBLE FOR THREAD stop()
         self.thread.parent.remove_child(self.thread)
         self.thread.start()
 
     def write(self, template, params):
         try:
-            self.queue.add({"template": template, "params": params})
+            self._enqueue([(template, params, time(), self._size(template, params))])
+            if _is_urgent(params) or len(self.queue.queue) >= self.max_batch:
+                self.wake.go()
+            return self
+        except Exception as e:
+            e = Except.wrap(e)
+            raise e  # OH NO!
+
+    def write_many(self, records):
+        try:
+            now = time()
+            self._enqueue([(template, params, now, self._size(template, params)) for template, params in records])
+            if len(self.queue.queue) >= self.max_batch or any(_is_urgent(params) for _, params in records):
+                self.wake.go()
             return self
         except Exception as e:
             e = Except.wrap(e)
             raise e  # OH NO!
 
+    def before_fork(self):
+        self.queue.lock.lock.acquire()
+        self.logger.before_fork()
+
+    def after_fork(self, child):
+        self.logger.after_fork(child)
+        self.queue.lock.lock.release()
+        if child:
+            # THE PARENT SENDS WHAT IS QUEUED; THE CHILD STARTS EMPTY, WITH ITS OWN WORKER
+            self.wake = Signal()
+            self.queued_bytes = 0
+            self.unreported = 0
+            self._start()
+
     def stop(self):
         try:
             self.queue.add(THREAD_STOP)  # BE PATIENT, LET REST OF MESSAGE BE SENT
+            self.wake.go()
             self.thread.join()
         except Exception as e:
             Log.info("problem in threaded logger" + str(e))
 
+    @property
+    def stats(self):
+        """
+        :return: ACHIEVED BATCH SIZE, END-TO-END LATENCY (SECONDS FROM write() UNTIL SENT TO logger), AND LOSS
+        """
+        return {
+            "batches": self.batches,
+            "records": self.records,
+            "mean_batch": self.records / self.batches if self.batches else 0,
+            "largest_batch": self.largest_batch,
+            "mean_latency": self.total_latency / self.records if self.records else 0,
+            "max_latency": self.max_seen_latency,
+            "queue": len(self.queue.queue),
+            "queue_bytes": self.queued_bytes,
+            "overflow": self.overflow,
+            "blocked": self.blocked,
+            "blocked_seconds": self.blocked_seconds,
+            "dropped": dict(self.dropped),
+            "errors": self.errors,
+        }
 
-def worker(logger: StructuredLogger, queue, period, please_stop):
-    please_stop.then(lambda: queue.close)
+    def _size(self, template, params):
+        if not self.max_bytes:
+            return 0
+        return _estimate_size(template, params)
 
-    try:
-        while not please_stop:
-            log = queue.pop(till=please_stop)
-            if please_stop:
-                break
-            logs = [log] + queue.pop_all()
-            for log in logs:
-                if log is THREAD_STOP:
-                    please_stop.go()
+    def _is_full(self):
+        # EXPECT self.queue.lock TO BE HAD
+        return len(self.queue.queue) >= self.max_size or (self.max_bytes and self.queued_bytes >= self.max_bytes)
+
+    def _enqueue(self, records):
+        queue = self.queue
+        with queue.lock:
+            for record in records:
+                if self._is_full() and not queue.closed and not self._make_room(record):
                     continue
+                queue.queue.append(record)
+                self.queued_bytes += record[3]
+
+    def _make_room(self, record):
+        """
+        EXPECT self.queue.lock TO BE HAD
+        :return: True IF record CAN BE ADDED TO THE QUEUE
+        """
+        queue = self.queue
+        self.wake.go()
+        if self.overflow == BLOCK:
+            self.blocked += 1
+            start = time()
+            while self._is_full() and not queue.closed:
+                queue.lock.wait(Till(seconds=1))
+            self.blocked_seconds += time() - start
+            return True
+        elif self.overflow == DROP_OLDEST:
+            # THREAD_STOP IS NOT A RECORD; DROP THE OLDEST REAL ONE
+            for i, oldest in enumerate(queue.queue):
+                if oldest is not THREAD_STOP:
+                    del queue.queue[i]
+                    self.queued_bytes -= oldest[3]
+                    self._drop(DROP_OLDEST)
+                    return True
+            # NOTHING OLDER TO DROP, SO THE NEW RECORD IS DROPPED
+            self._drop(DROP_NEWEST)
+            return False
+        elif self.overflow == DROP_BELOW_SEVERITY and _level(record[1]) >= self.keep_level:
+            # NEVER DROP IMPORTANT RECORDS, EVEN IF IT MEANS GOING OVER THE LIMIT
+            return True
+        self._drop(self.overflow)
+        return False
 
-                logger.write(**log)
-            (Till(seconds=period) | please_stop).wait()
+    def _drop(self, policy):
+        # EXPECT self.queue.lock TO BE HAD
+        self.dropped[policy] += 1
+        self.unreported += 1
 
-        # ONE LAST DRAIN
-        for log in queue.pop_all():
-            if log is not THREAD_STOP:
-                logger.write(**log)
+    def _pop_all(self):
+        queue = self.queue
+        with queue.lock:
+            output = list(queue.queue)
+            queue.queue.clear()
+            self.queued_bytes = 0
+        return output
 
-        logger.stop()
-    except Exception as e:
-        import sys
+    def _drop_report(self):
+        """
+        :return: A SYNTHETIC RECORD, IF MESSAGES WERE DROPPED, AND IT IS TIME TO SAY SO
+        """
+        now = time()
+        if not self.unreported or now < self.next_report:
+            return None
+        with self.queue.lock:
+            num, self.unreported = self.unreported, 0
+        self.next_report = now + self.report_period
+        params = LogItem(
+            severity=WARNING,
+            template="{{num}} log messages dropped by {{policy}} policy",
+            params=dict_to_data({"num": num, "policy": self.overflow}),
+            timestamp=utcnow(),
+        )
+        return DROP_TEMPLATE, params, now, 0
 
-        e = Except.wrap(e)
+    def _worker(self, please_stop):
+        queue = self.queue
+        please_stop.then(lambda: queue.close)
 
-        sys.stderr.write("problem in " + StructuredLogger_usingThread.__name__ + ": " + str(e))
+        try:
+            while not please_stop:
+                till = please_stop
+                if self.unreported:
+                    till = till | Till(till=self.next_report)
+                first = queue.pop(till=till)
+                if please_stop:
+                    break
+                if first is None:
+                    # TIME TO REPORT DROPPED MESSAGES
+                    self._send(self._pop_all())
+                    continue
+                if first is not THREAD_STOP and not _is_urgent(first[1]) and len(queue.queue) + 1 < self.max_batch:
+                    # COALESCE UNTIL THE FIRST RECORD HAS WAITED LONG ENOUGH
+                    (self.wake | please_stop | Till(till=first[2] + self.max_latency)).wait()
+                self.wake = Signal()
+                logs = [first] + self._pop_all()
+                if THREAD_STOP in logs:
+                    please_stop.go()
+                    logs = [log for log in logs if log is not THREAD_STOP]
+                self._send(logs)
+
+            # ONE LAST DRAIN
+            self.next_report = 0
+            self._send([log for log in self._pop_all() if log is not THREAD_STOP])
+
+            self.logger.stop()
+        except Exception as e:
+            import sys
+
+            e = Except.wrap(e)
+
+            sys.stderr.write("problem in " + StructuredLogger_usingThread.__name__ + ": " + str(e))
+
+    def _send(self, logs):
+        report = self._drop_report()
+        if report:
+            logs.append(report)
+        if not logs:
+            return
+        try:
+            self.logger.write_many([(template, params) for template, params, _, _ in logs])
+        except Exception as e:
+            # KEEP GOING, SO THE QUEUE DOES NOT FILL AND BLOCK THE CALLERS
+            import sys
+
+            self.errors += 1
+            sys.stderr.write("problem in " + StructuredLogger_usingThread.__name__ + ": " + str(Except.wrap(e)))
+        now = time()
+        latencies = [now - enqueued for _, _, enqueued, _ in logs]
+        self.batches += 1
+        self.records += len(logs)
+        self.largest_batch = max(self.largest_batch, len(logs))
+        self.total_latency += sum(latencies)
+        self.max_seen_latency = max(self.max_seen_latency, max(latencies))
+
+
+def _level(params):
+    try:
+        return SEVERITY_LEVEL.get(params["severity"], 0)
+    except Exception:
+        return 0
+
+
+def _is_urgent(params):
+    return _level(params) >= URGENT_LEVEL
+
+
+def _estimate_size(template, params):
+    """
+    ROUGH SIZE OF A RECORD, IN BYTES; CHEAPER THAN SERIALIZING IT
+    """
+    size = RECORD_OVERHEAD + len(template)
+    try:
+        params = from_data(params).get("params") or {}
+        if params.__class__ is ChainedParams:
+            # THE extras ARE SHARED BY MANY RECORDS
+            params = params.own
+        for value in from_data(params).values():
+            if isinstance(value, (str, bytes)):
+                size += len(value)
+    except Exception:
+        pass
+    return size
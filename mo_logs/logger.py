@@ -1,13 +1,16 @@
+import os
 import sys
 from threading import current_thread
 
-from mo_dots import to_data, unwraplist, Data, is_data, coalesce, listwrap
+from mo_dots import to_data, unwraplist, Data, is_data, coalesce, listwrap, from_data, dict_to_data
 from mo_future import utcnow, is_text
 from mo_imports import delay_import
 from mo_kwargs import override
 
 from mo_logs import constants as _constants, exceptions, strings
-from mo_logs.exceptions import Except, LogItem, WARNING, get_stacktrace
+from mo_logs.cache import Cache, DEFAULT_CACHE_SIZE
+from mo_logs.exceptions import Except, LogItem, WARNING, get_stacktrace, get_frames, frame_info, NOTE, SEVERITY_LEVEL, ALARM
+from mo_logs.lazy import Lazy
 from mo_logs.log_usingPrint import StructuredLogger_usingPrint
 from mo_logs.strings import CR, indent, parse_template
 from mo_logs.utils import (
@@ -18,15 +21,17 @@ from mo_logs.utils import (
     _add_thread,
     _known_loggers,
     ExtrasContext,
-    MO_LOGS_EXTRAS,
+    ChainedParams,
+    current_extras,
     STACKTRACE,
 )
 
 StructuredLogger_usingMulti = delay_import("mo_logs.log_usingMulti.StructuredLogger_usingMulti")
 startup_read_settings = delay_import("mo_logs.startup.read_settings")
 
-all_log_callers = {}
-cached_templates = {}
+all_log_callers = Cache("log callers")
+cached_templates = Cache("templates")
+cache_size = DEFAULT_CACHE_SIZE
 trace = False
 main_log = StructuredLogger_usingPrint()
 logging_multi = None
@@ -34,6 +39,11 @@ profiler = None  # simple pypy-friendly profiler
 error_mode = False  # prevent error loops
 extra = {}
 static_template = True
+min_severity = NOTE  # LOG CALLS BELOW THIS SEVERITY ARE IGNORED
+module_severity = {}  # MAP FROM MODULE NAME TO min_severity FOR THAT MODULE (AND SUB-MODULES)
+_min_level = 0
+_module_levels = {}  # CACHE OF RESOLVED LEVEL FOR EACH CALLING MODULE
+THREAD_INFO = "mo-logs-thread-info"  # ATTRIBUTE OF EACH THREAD, HOLDING ITS {"name", "id"}
 
 
 @override("settings")
@@ -45,6 +55,14 @@ def start(
     extra=None,
     app_name=None,
     static_template=True,
+    cache_size=DEFAULT_CACHE_SIZE,
+    min_severity=NOTE,
+    module_severity=None,
+    queue=None,
+    fan_out=False,
+    breaker=None,
+    ring=None,
+    loop=None,
     settings=None,
 ):
     """
@@ -59,6 +77,22 @@ def start(
     :param extra: ADDITIONAL DATA TO BE INCLUDED IN EVERY LOG LINE
     :param app_name: GIVE THIS APP A NAME, AND RETURN A CONTEXT MANAGER
     :param static_template: IF TRUE, THEN ASSUME TEMPLATE IS STATIC AND CACHE PARSED TEMPLATE
+    :param cache_size: MAXIMUM NUMBER OF TEMPLATES, AND CALL SITES, TO REMEMBER (default 10000)
+    :param min_severity: IGNORE LOG CALLS BELOW THIS SEVERITY (default NOTE)
+    :param module_severity: MAP FROM MODULE NAME TO min_severity FOR THAT MODULE, AND ITS SUB-MODULES
+    :param queue: SETTINGS FOR THE LOGGING THREAD {"max_latency": 0.3, "max_batch": 1000}
+                  RECORDS WAIT UP TO max_latency SECONDS TO BE BATCHED, UNLESS max_batch ARE WAITING,
+                  OR A WARNING (OR WORSE) ARRIVES
+    :param fan_out: GIVE EACH OF THE logs ITS OWN queue AND THREAD, SO A SLOW ONE DOES NOT HOLD UP THE REST (default False)
+    :param breaker: SETTINGS FOR THE CIRCUIT BREAKER IN FRONT OF EACH OF THE logs {"min_backoff": 1, "max_backoff": 300, "max_held": 1000}
+                    A FAILING LOG IS RETRIED AFTER min_backoff SECONDS, DOUBLING UP TO max_backoff; max_held RECORDS ARE KEPT MEANWHILE
+    :param ring: SETTINGS FOR A CRASH RING {"file": "crash.ring", "size": 1048576}
+                 EVERY RECORD IS COPIED TO THIS MEMORY-MAPPED FILE BEFORE IT IS QUEUED, SO IT SURVIVES A CRASH
+                 THE COPY IS ENCODED ON THE CALLING THREAD (A FEW MICROSECONDS PER RECORD), SO IT HOLDS ONLY
+                 THE params OF THE LOG CALL, WITHOUT THE extras, AND Lazy VALUES ARE NOT RESOLVED
+    :param loop: QUEUE RECORDS ON THIS asyncio EVENT LOOP (True FOR THE RUNNING LOOP), INSTEAD OF A THREAD
+                 THE logs ARE CALLED ON THE LOOP: USE NON-BLOCKING ONES, OR AsyncStructuredLogger
+                 await flush() BEFORE stop(), SO NO RECORDS ARE LOST
     :param settings: ALL THE ABOVE PARAMETERS
     :return:
     """
@@ -79,12 +113,26 @@ def _start(
     extra=None,
     app_name=None,
     static_template=True,
+    cache_size=DEFAULT_CACHE_SIZE,
+    min_severity=NOTE,
+    module_severity=None,
+    queue=None,
+    fan_out=False,
+    breaker=None,
+    ring=None,
+    loop=None,
     settings=None,
 ):
     stop()
     globals()["settings"] = settings
     globals()["trace"] = trace
     globals()["static_template"] = static_template
+    set_cache_size(cache_size)
+    set_severity(min_severity)
+    module_severity = from_data(module_severity) or {}
+    globals()["module_severity"] = {}
+    for module, severity in module_severity.items():
+        set_severity(severity, module=module)
 
     # ENABLE CPROFILE
     if cprofile is False:
@@ -101,11 +149,21 @@ def _start(
 
     logs = coalesce(settings.log, logs)
     if logs:
-        globals()["logging_multi"] = StructuredLogger_usingMulti()
+        globals()["logging_multi"] = StructuredLogger_usingMulti(fan_out=fan_out, queue=queue, breaker=breaker)
         for log in listwrap(logs):
             logging_multi.add_log(new_instance(log))
 
-        old_log, globals()["main_log"] = main_log, _add_thread(logging_multi)
+        if loop:
+            from mo_logs.log_usingAsync import StructuredLogger_usingAsync
+
+            new_log = StructuredLogger_usingAsync(logging_multi, loop=None if loop is True else loop)
+        else:
+            new_log = _add_thread(logging_multi, queue)
+        if ring:
+            from mo_logs.log_usingRing import StructuredLogger_usingRing
+
+            new_log = StructuredLogger_usingRing(logger=new_log, settings=ring)
+        old_log, globals()["main_log"] = main_log, new_log
         old_log.stop()
     globals()["extra"] = extra or {}
     if isinstance(app_name, str):
@@ -124,6 +182,87 @@ def stop():
     globals()["cprofile"] = False
 
 
+async def flush():
+    """
+    WAIT FOR RECORDS QUEUED ON THE RUNNING asyncio LOOP (SEE start(loop=...)) TO BE SENT TO THE logs
+    """
+    from mo_logs.log_usingAsync import flush as flush_loop
+
+    await flush_loop()
+
+
+def set_cache_size(size):
+    """
+    LIMIT THE NUMBER OF TEMPLATES, AND CALL SITES, TO REMEMBER
+    """
+    globals()["cache_size"] = size
+    for c in (cached_templates, all_log_callers, strings.compiled_templates):
+        c.resize(size)
+
+
+def set_severity(severity, module=None):
+    """
+    IGNORE LOG CALLS BELOW severity; CAN BE CHANGED AT ANY TIME
+    :param severity: MINIMUM SEVERITY (NOTE, ALARM, WARNING, ...); None TO REMOVE A module SETTING
+    :param module: APPLY ONLY TO THIS MODULE, AND ITS SUB-MODULES
+    """
+    if severity is not None:
+        severity = severity.upper()
+        if severity not in SEVERITY_LEVEL:
+            error(
+                "Expecting severity to be one of {severities}, not {severity|quote}",
+                severities=list(SEVERITY_LEVEL),
+                severity=severity,
+            )
+
+    if module:
+        if severity is None:
+            module_severity.pop(module, None)
+        else:
+            module_severity[module] = severity
+    else:
+        globals()["min_severity"] = severity or NOTE
+        globals()["_min_level"] = SEVERITY_LEVEL[min_severity]
+    _module_levels.clear()
+
+
+def _suppressed(severity, stack_depth):
+    """
+    RETURN True IF A LOG CALL OF GIVEN severity, FROM THE CALLER (AT stack_depth), IS TO BE IGNORED
+    """
+    level = SEVERITY_LEVEL.get(severity, 0)
+    if not module_severity:
+        return level < _min_level
+    module = sys._getframe(stack_depth + 2).f_globals.get("__name__")
+    min_level = _module_levels.get(module)
+    if min_level is None:
+        min_level = _module_levels[module] = _module_level(module)
+    return level < min_level
+
+
+def _module_level(module):
+    name = module
+    while name:
+        severity = module_severity.get(name)
+        if severity:
+            return SEVERITY_LEVEL[severity]
+        name = name.rpartition(".")[0]
+    return _min_level
+
+
+def stats():
+    """
+    :return: CACHE STATISTICS, FOR MONITORING TEMPLATE CARDINALITY, AND LOGGING THREAD BATCH STATISTICS
+    """
+    return to_data({
+        "templates": cached_templates.stats,
+        "callers": all_log_callers.stats,
+        "compiled": strings.compiled_templates.stats,
+        "thread": getattr(main_log, "stats", None),
+        "logs": getattr(logging_multi, "stats", None),
+    })
+
+
 @override("settings")
 def new_instance(log_type=None, settings=None):
     if settings["class"]:
@@ -138,6 +277,10 @@ def new_instance(log_type=None, settings=None):
             return clazz(settings)
         error("Log type of {config|json} is not recognized", config=settings)
     else:
+        from mo_logs.log_usingAsync import AsyncStructuredLogger, StructuredLogger_usingAsync
+
+        if isinstance(log_type, AsyncStructuredLogger):
+            return StructuredLogger_usingAsync(log_type)
         if hasattr(log_type, "write"):
             return log_type
         return log_type
@@ -163,6 +306,8 @@ def note(
     :param more_params: *any more parameters (which will overwrite default_params)
     :return:
     """
+    if _suppressed(NOTE, stack_depth):
+        return
     timestamp = utcnow()
     if not isinstance(template, str):
         error("logger.info was expecting a string template")
@@ -189,6 +334,8 @@ def alarm(
     :param more_params: more parameters (which will overwrite default_params)
     :return:
     """
+    if _suppressed(ALARM, stack_depth):
+        return
     timestamp = utcnow()
     template = ("*" * 80) + CR + indent(template, prefix="** ").strip() + CR + ("*" * 80)
     _annotate(
@@ -214,6 +361,8 @@ def warning(
     static_template=None,
     **more_params,  # any more parameters (which will overwrite default_params)
 ):
+    if _suppressed(log_severity, stack_depth):
+        return
     if exc_info is True:
         exc_type, exc_value, exc_traceback = sys.exc_info()
         exc_info = Except.wrap(exc_value)
@@ -228,7 +377,7 @@ def warning(
 
     params = to_data(dict(default_params, **more_params))
     cause = unwraplist([Except.wrap(c, stack_depth=2) for c in listwrap(cause or exc_info)])
-    trace = exceptions.get_stacktrace(stack_depth + 1)
+    trace = exceptions.get_frames(stack_depth + 1)
 
     e = Except(severity=log_severity, template=template, params=params, cause=cause, trace=trace)
     _annotate(
@@ -270,12 +419,23 @@ def error(
 
     params = to_data(dict(default_params, **more_params))
     cause = unwraplist([Except.wrap(c, stack_depth=2) for c in listwrap(cause or exc_info)])
-    trace = exceptions.get_stacktrace(stack_depth + 1)
+    trace = exceptions.get_frames(stack_depth + 1)
 
     e = Except(severity=exceptions.ERROR, template=template, params=params, cause=cause, trace=trace)
     raise_from_none(e)
 
 
+def _thread_info(thread):
+    """
+    :return: {"name", "id"} OF thread, MADE ONCE PER THREAD (AND AGAIN IF IT IS RENAMED)
+    """
+    info = getattr(thread, THREAD_INFO, None)
+    if info is None or info.name != thread.name:
+        info = dict_to_data({"name": thread.name, "id": thread.ident})
+        setattr(thread, THREAD_INFO, info)
+    return info
+
+
 def _annotate(item, stack_depth, static_template):
     """
     :param item:  A LogItem THE TYPE OF MESSAGE
@@ -293,18 +453,17 @@ def _annotate(item, stack_depth, static_template):
 
     if isinstance(item, Except):
         param_template = "{severity}: " + param_template + STACKTRACE
-        temp = item.__data__()
-        temp.trace_text = item.trace_text
-        temp.cause_text = item.cause_text
-        item = temp
-    else:
-        item = item.__data__()
+        e = item
+        item = LogItem(severity=e.severity, template=e.template, params=e.params, timestamp=e.timestamp)
+        item.trace = e.trace
+        item.cause = to_data(unwraplist([c.__data__() for c in listwrap(e.cause)]))
+        item.trace_text = Lazy(lambda: e.trace_text)
+        item.cause_text = Lazy(lambda: e.cause_text)
 
     if not param_template.startswith(CR) and CR in param_template:
         param_template = CR + param_template
 
     thread = current_thread()
-    thread_extra = getattr(thread, MO_LOGS_EXTRAS, [{}])[-1]
     if trace:
         item.machine = machine_metadata()
         log_format = item.template = (
@@ -314,11 +473,7 @@ def _annotate(item, stack_depth, static_template):
             + param_template
         )
         f = sys._getframe(stack_depth + 1)
-        item.location = {
-            "line": f.f_lineno,
-            "file": f.f_code.co_filename,
-            "method": f.f_code.co_name,
-        }
+        item.location = frame_info(f.f_code, f.f_lineno)
         if static_template:
             last_caller_loc = (f.f_code.co_filename, f.f_lineno)
             prev_template = all_log_callers.get(last_caller_loc)
@@ -327,17 +482,75 @@ def _annotate(item, stack_depth, static_template):
                     raise Except(
                         template="Expecting logger call to be static: was {a|quote} now {b|quote}",
                         params={"a": prev_template, "b": given_template},
-                        trace=get_stacktrace(stack_depth + 1),
+                        trace=get_frames(stack_depth + 1),
                     )
                 all_log_callers[last_caller_loc] = given_template
-        item.thread = {"name": thread.name, "id": thread.ident}
+        item.thread = _thread_info(thread)
     else:
         log_format = param_template
         # log_format = item.template = "{timestamp|datetime} - " + template
 
-    item.params = {**thread_extra, **extra, **item.params}
+    item.params = ChainedParams((item.params, extra) + current_extras())
     main_log.write(log_format, item)
 
 
 def extras(**kwargs):
     return ExtrasContext(kwargs)
+
+
+def _before_fork():
+    """
+    HOLD EVERY LOCK, SO THE CHILD DOES NOT INHERIT A HALF-WRITTEN BATCH, OR A LOCK THAT WILL NEVER BE RELEASED
+    """
+    global _forking_log, _forking_locks
+    _forking_log = main_log
+    _forking_log.before_fork()
+    # LAST, BECAUSE A LOGGER MAY START A THREAD WHILE HOLDING ITS OWN LOCK
+    _forking_locks = _mo_threads_locks()
+    for lock in _forking_locks:
+        lock.acquire()
+
+
+def _after_fork_in_parent():
+    for lock in reversed(_forking_locks):
+        lock.release()
+    _forking_log.after_fork(False)
+
+
+def _after_fork_in_child():
+    """
+    ONLY THE FORKING THREAD SURVIVES: THE LOGGING THREADS, AND THE mo_threads TIMER, ARE GONE
+    """
+    for lock in reversed(_forking_locks):
+        lock.release()
+    if _forking_locks:
+        threads = sys.modules["mo_threads.threads"]
+        all_threads = getattr(threads, "ALL", None)
+        start_main_thread = getattr(threads, "start_main_thread", None)
+        if hasattr(all_threads, "clear") and callable(start_main_thread):
+            all_threads.clear()
+            start_main_thread()
+    _forking_log.after_fork(True)
+
+
+def _mo_threads_locks():
+    """
+    mo_threads HAS NO fork() HOOK, SO WE HOLD ITS (PRIVATE) LOCKS OURSELVES
+    :return: THE LOCKS FOUND; NONE IF mo_threads IS NOT LOADED, OR NO LONGER HAS THEM
+    """
+    threads = sys.modules.get("mo_threads.threads")
+    till = sys.modules.get("mo_threads.till")
+    if threads is None or till is None:
+        return ()
+    locks = (getattr(threads, "ALL_LOCK", None), getattr(getattr(till, "Till", None), "locker", None))
+    if not all(hasattr(lock, "acquire") and hasattr(lock, "release") for lock in locks):
+        return ()
+    return locks
+
+
+_forking_log = None
+_forking_locks = ()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(
+        before=_before_fork, after_in_parent=_after_fork_in_parent, after_in_child=_after_fork_in_child,
+    )
@@ -0,0 +1,53 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from threading import local
+
+from mo_logs.strings import expand_template
+
+_local = local()
+
+
+class RenderMemo:
+    """
+    WHILE IN CONTEXT, render() ON THIS THREAD REMEMBERS WHAT IT EXPANDED
+    SO MANY LOGGERS, GIVEN THE SAME RECORDS, EXPAND EACH ONLY ONCE
+
+        with RenderMemo():
+            for logger in loggers:
+                logger.write_many(records)
+    """
+
+    __slots__ = ["outer"]
+
+    def __enter__(self):
+        self.outer = getattr(_local, "memo", None)
+        if self.outer is None:
+            _local.memo = {}
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self.outer is None:
+            _local.memo = None
+
+
+def render(template, params):
+    """
+    SAME AS expand_template(), BUT EXPANDED ONCE PER (template, params) INSIDE A RenderMemo
+    THE RECORDS MUST NOT BE CHANGED WHILE IN CONTEXT
+    """
+    memo = getattr(_local, "memo", None)
+    if memo is None:
+        return expand_template(template, params)
+    # THE MEMO KEEPS params ALIVE, SO ITS id() IS NOT REUSED BY ANOTHER RECORD WHILE IN CONTEXT
+    key = (template, id(params))
+    entry = memo.get(key)
+    if entry is None or entry[0] is not params:
+        entry = memo[key] = (params, expand_template(template, params))
+    return entry[1]
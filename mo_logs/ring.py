@@ -0,0 +1,174 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+"""
+CRASH RING: A FIXED-SIZE, MEMORY-MAPPED, CIRCULAR FILE OF THE MOST RECENT RECORDS
+THE OS KEEPS THE PAGES WHEN THE PROCESS DIES, SO THE LAST RECORDS CAN BE RECOVERED
+
+    FILE   = HEADER DATA
+    HEADER = magic:8 capacity:u64 cursor:u64 sequence:u64 (PADDED TO 64 BYTES)
+    ENTRY  = mark:4 length:u32 sequence:u64 crc32:u32 payload
+
+AN ENTRY THAT DOES NOT FIT BEFORE THE END OF DATA STARTS AGAIN AT THE BEGINNING
+RECOVERY SCANS FOR ENTRIES WITH A GOOD crc32, SO A TORN WRITE IS IGNORED
+
+USAGE:  python -m mo_logs.ring [--last N] [--expand] FILE
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta
+
+from mo_dots import to_data
+
+from mo_logs.binary import _add_text
+
+MAGIC = b"MORING\x00\x01"
+HEADER = struct.Struct("<8sQQQ")
+HEADER_SIZE = 64
+ENTRY = struct.Struct("<4sIQI")
+MARK = b"\xe2\x97\x8fR"
+EPOCH = datetime(1970, 1, 1)
+
+
+class Ring:
+    """
+    APPEND PAYLOADS TO A CRASH RING; EACH append() IS MEMORY COPIES ONLY (NO SYSTEM CALLS)
+    NOT THREAD SAFE
+    """
+
+    def __init__(self, filename, size):
+        """
+        :param filename: NAME OF THE FILE; AN EXISTING RING OF THE SAME size IS CONTINUED
+        :param size: BYTES OF DATA (NOT INCLUDING THE HEADER)
+        """
+        self.capacity = size
+        fd = os.open(filename, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != HEADER_SIZE + size:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, HEADER_SIZE + size)
+            self.memory = mmap.mmap(fd, HEADER_SIZE + size)
+        finally:
+            os.close(fd)
+        magic, capacity, cursor, sequence = HEADER.unpack_from(self.memory, 0)
+        if magic == MAGIC and capacity == size and cursor < size:
+            self.cursor, self.sequence = cursor, sequence
+        else:
+            self.cursor, self.sequence = 0, 0
+            HEADER.pack_into(self.memory, 0, MAGIC, size, 0, 0)
+
+    def append(self, payload):
+        """
+        :param payload: BYTES; TRUNCATED IF MORE THAN HALF THE RING
+        """
+        memory = self.memory
+        payload = payload[: self.capacity // 2 - ENTRY.size]
+        length = ENTRY.size + len(payload)
+        cursor = self.cursor
+        if cursor + length > self.capacity:
+            cursor = 0
+        start = HEADER_SIZE + cursor
+        memory[start + ENTRY.size : start + length] = payload
+        ENTRY.pack_into(memory, start, MARK, len(payload), self.sequence, zlib.crc32(payload))
+        self.cursor = cursor + length
+        self.sequence += 1
+        HEADER.pack_into(memory, 0, MAGIC, self.capacity, self.cursor, self.sequence)
+
+    def close(self):
+        self.memory.close()
+
+
+def read_ring(filename, last=None):
+    """
+    :param filename: NAME OF THE RING FILE
+    :param last: ONLY THE LAST N RECORDS (default all that survive)
+    :return: LIST OF (template, params), OLDEST FIRST
+    """
+    with open(filename, "rb") as source:
+        content = source.read()
+    magic, capacity, _, _ = HEADER.unpack_from(content, 0)
+    if magic != MAGIC:
+        raise Exception(f"{filename} is not a crash ring")
+    data = memoryview(content)[HEADER_SIZE : HEADER_SIZE + capacity]
+
+    entries = {}
+    i = 0
+    while True:
+        i = content.find(MARK, HEADER_SIZE + i, HEADER_SIZE + capacity) - HEADER_SIZE
+        if i < 0:
+            break
+        if i + ENTRY.size > capacity:
+            break
+        _, length, sequence, crc = ENTRY.unpack_from(data, i)
+        end = i + ENTRY.size + length
+        if end <= capacity:
+            payload = data[i + ENTRY.size : end]
+            if zlib.crc32(payload) == crc:
+                entries[sequence] = bytes(payload)
+                i = end
+                continue
+        i += 1
+
+    sequences = sorted(entries)
+    if last is not None:
+        sequences = sequences[-last:] if last else []
+    return [decode(entries[s]) for s in sequences]
+
+
+def encode(template, params):
+    """
+    :return: PAYLOAD FOR ONE RECORD: JSON OF [template, params]
+    """
+    from mo_logs.log_usingJsonLines import encode, encode_orjson, orjson
+
+    record = (encode_orjson if orjson else encode)(params)
+    return b"[" + json.dumps(template).encode("utf8") + b"," + record[:-1] + b"]"
+
+
+def decode(payload):
+    try:
+        template, params = json.loads(payload)
+    except Exception:
+        # TRUNCATED, BECAUSE IT WAS TOO BIG
+        return "{text}", to_data({"text": payload.decode("utf8", "replace")})
+    timestamp = params.get("timestamp")
+    if isinstance(timestamp, (int, float)):
+        params["timestamp"] = EPOCH + timedelta(seconds=timestamp)
+    if params.get("trace"):
+        _add_text(params)
+    return template, to_data(params)
+
+
+def main(args):
+    import argparse
+
+    from mo_json import value2json
+
+    from mo_logs.strings import expand_template
+
+    parser = argparse.ArgumentParser(prog="python -m mo_logs.ring", description="Recover records from a crash ring")
+    parser.add_argument("file", metavar="FILE")
+    parser.add_argument("--last", type=int, help="only the last N records")
+    parser.add_argument("--expand", action="store_true", help="show the expanded template, not the JSON")
+    args = parser.parse_args(args)
+
+    for template, params in read_ring(args.file, args.last):
+        if args.expand:
+            print(expand_template(template, params))
+        else:
+            print(value2json(params))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -7,6 +7,7 @@
 #
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
+import ast
 import json as _json
 import math
 import os
@@ -19,6 +20,9 @@ from mo_dots import Data, coalesce, is_data, is_list, to_data, is_sequence, is_m
 from mo_future import get_function_name, is_text, round as _round, transpose, xrange, zip_longest, binary_type
 from mo_imports import delay_import
 
+from mo_logs.cache import Cache
+from mo_logs.lazy import Lazy
+
 builtin_hex = hex
 _str, str = str, None
 
@@ -559,50 +563,150 @@ def _simple_expand(template, seq: Tuple[Data]):
     seq IS TUPLE OF OBJECTS IN PATH ORDER INTO THE DATA TREE
     seq[-1] IS THE CURRENT CONTEXT
     """
-    parsed = parse_template(template)
+    return compile_template(template).run(seq)
 
-    result = []
-    for text, code in parsed:
-        result.append(text)
-        if not code:
-            continue
-        path, *rest = code.split("|")
-        var = path.lstrip(".")
-        depth = min(len(seq), max(1, len(path) - len(var)))
+
+compiled_templates = Cache("compiled templates")
+
+
+def compile_template(template):
+    """
+    RETURN THE (CACHED) CompiledTemplate FOR GIVEN TEMPLATE STRING
+    """
+    output = compiled_templates.get(template)
+    if output is None:
+        output = compiled_templates[template] = CompiledTemplate(template)
+    return output
+
+
+class CompiledTemplate:
+    """
+    TEMPLATE PARSED ONCE: PATHS, DEPTHS AND FORMATTERS ARE RESOLVED SO
+    EXPANSION IS A SIMPLE WALK OVER THE STEPS
+    """
+
+    __slots__ = ["template", "steps"]
+
+    def __init__(self, template):
+        self.template = template
+        self.steps = tuple(_compile_step(text, code) for text, code in parse_template(template))
+
+    def expand(self, value):
+        """
+        SAME AS expand_template(self.template, value)
+        """
         try:
-            val = seq[-depth]
-            if var:
-                if is_sequence(val) and float(var) == _round(float(var), 0):
-                    val = val[int(var)]
-                else:
-                    val = val[var]
-            for func_name in rest:
-                parts = func_name.split("(", 1)
-                if len(parts) > 1:
-                    val = eval(parts[0] + "(val, " + parts[1])
-                else:
-                    func = FORMATTERS.get(func_name)
-                    if not func:
-                        raise Exception(f"{CAN_NOT_FIND_FORMATTER} {func_name}")
+            return self.run((to_data(value),))
+        except Exception as e:
+            return "FAIL TO EXPAND: " + self.template
+
+    def run(self, seq):
+        """
+        seq IS TUPLE OF OBJECTS IN PATH ORDER INTO THE DATA TREE
+        """
+        result = []
+        for text, code, var, depth, index, formatters in self.steps:
+            result.append(text)
+            if not code:
+                continue
+            try:
+                val = seq[-min(len(seq), depth)]
+                if var:
+                    if index is not None and is_sequence(val):
+                        val = val[index]
+                    else:
+                        val = val[var]
+                if val.__class__ is Lazy:
+                    val = val.get()
+                for func in formatters:
                     val = func(val)
 
-            val = to_string(val)
-            result.append(val)
+                val = to_string(val)
+                result.append(val)
+            except Exception as cause:
+                from mo_logs import Except
+
+                cause = Except.wrap(cause)
+                try:
+                    if "is not JSON serializable" in cause.message:
+                        # WORK HARDER
+                        val = to_string(val)
+                        result.append(val)
+                except Exception as f:
+                    pass
+                logger.warning("template expansion error {code}", code=str(code), cause=cause)
+                result.append(f"[template expansion error: ({cause.message})]")
+
+        return "".join(result)
+
+
+def _compile_step(text, code):
+    """
+    RETURN (text, code, var, depth, index, formatters) TUPLE
+    """
+    if not code:
+        return text, code, None, 0, None, ()
+    path, *rest = code.split("|")
+    var = path.lstrip(".")
+    depth = max(1, len(path) - len(var))
+    try:
+        index = int(var) if float(var) == _round(float(var), 0) else None
+    except Exception:
+        index = None
+    return text, code, var, depth, index, tuple(_compile_formatter(r) for r in rest)
+
+
+def _compile_formatter(func_name):
+    """
+    RETURN FUNCTION THAT ACCEPTS A VALUE, AND RETURNS THE FORMATTED VALUE
+    FORMATTER ARGUMENTS ARE PARSED HERE, ONCE, SO EXPANSION IS A PLAIN CALL
+    """
+    name, *arguments = func_name.split("(", 1)
+    name = name.strip()
+    if arguments:
+        try:
+            args, kwargs = _parse_arguments(arguments[0])
         except Exception as cause:
-            from mo_logs import Except
+            problem = cause
 
-            cause = Except.wrap(cause)
-            try:
-                if "is not JSON serializable" in cause.message:
-                    # WORK HARDER
-                    val = to_string(val)
-                    result.append(val)
-            except Exception as f:
-                pass
-            logger.warning("template expansion error {code}", code=str(code), cause=cause)
-            result.append(f"[template expansion error: ({cause.message})]")
-
-    return "".join(result)
+            def bad_arguments(val):
+                raise Exception(f"Can not parse arguments of {func_name}") from problem
+
+            return bad_arguments
+    else:
+        args, kwargs = (), {}
+
+    def lookup():
+        func = FORMATTERS.get(name)
+        if not func:
+            raise Exception(f"{CAN_NOT_FIND_FORMATTER} {name}")
+        return func
+
+    func = FORMATTERS.get(name)
+    if not func:
+        # FORMATTER MAY BE REGISTERED LATER
+        return lambda val: lookup()(val, *args, **kwargs)
+    elif args or kwargs:
+        return lambda val: func(val, *args, **kwargs)
+    else:
+        return func
+
+
+def _parse_arguments(code):
+    """
+    :param code: THE ARGUMENT LIST, WITH CLOSING PARENTHESIS (eg "places=2)")
+    :return: (args, kwargs) OF LITERAL VALUES
+    """
+    call = ast.parse("f(" + code, mode="eval").body
+    if not isinstance(call, ast.Call):
+        raise Exception(f"Expecting argument list, not {code}")
+    args = tuple(ast.literal_eval(a) for a in call.args)
+    kwargs = {}
+    for k in call.keywords:
+        if k.arg is None:
+            raise Exception(f"Expecting named arguments, not {code}")
+        kwargs[k.arg] = ast.literal_eval(k.value)
+    return args, kwargs
 
 
 def chunk(data, size):
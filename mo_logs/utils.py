@@ -8,9 +8,10 @@
 # Contact: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
 import os
+from contextvars import ContextVar
 from threading import current_thread
 
-from mo_dots import Data, coalesce, dict_to_data
+from mo_dots import Data, coalesce, dict_to_data, from_data, to_data
 from mo_future import STDOUT
 from mo_imports import delay_import
 
@@ -19,6 +20,7 @@ from mo_logs.log_usingPrint import StructuredLogger_usingPrint
 
 STACKTRACE = "\n{trace_text|indent}\n{cause_text}"
 MO_LOGS_EXTRAS = "mo-logs-extras"
+_extras = ContextVar(MO_LOGS_EXTRAS, default=None)  # FOLLOWS asyncio TASKS, AS WELL AS THREADS
 startup_read_settings = delay_import("mo_logs.startup.read_settings")
 
 
@@ -37,6 +39,9 @@ class BackupLogContext:
             error_mode=logger.error_mode,
             extra=logger.extra,
             static_template=logger.static_template,
+            cache_size=logger.cache_size,
+            min_severity=logger.min_severity,
+            module_severity=dict(logger.module_severity),
         )
         self.inside = False
 
@@ -56,6 +61,9 @@ class BackupLogContext:
         logger.error_mode = self.old_settings.error_mode
         logger.extra = self.old_settings.extra
         logger.static_template = self.old_settings.static_template
+        logger.set_cache_size(self.old_settings.cache_size)
+        logger.module_severity = from_data(self.old_settings.module_severity)
+        logger.set_severity(self.old_settings.min_severity)
 
 
 def getLogger(*args, **kwargs):
@@ -65,18 +73,135 @@ def getLogger(*args, **kwargs):
 class ExtrasContext:
     def __init__(self, extra):
         self.extra = extra
+        self.token = None
 
     def __enter__(self):
-        stack = getattr(current_thread(), MO_LOGS_EXTRAS, None)
-        if stack:
-            stack.append({**stack[-1], **self.extra})
-        else:
-            stack = [{}, self.extra]
-            setattr(current_thread(), MO_LOGS_EXTRAS, stack)
+        thread = current_thread()
+        inherited = getattr(thread, MO_LOGS_EXTRAS, None)
+        if inherited.__class__ is not _ThreadExtras:
+            setattr(thread, MO_LOGS_EXTRAS, _ThreadExtras(_layers(inherited[-1]) if inherited else ()))
+        # NEWEST LAYER FIRST; NOTHING IS MERGED UNTIL A RECORD IS SERIALIZED
+        self.token = _extras.set((self.extra,) + current_extras())
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        stack = getattr(current_thread(), MO_LOGS_EXTRAS)
-        stack.pop()
+        _extras.reset(self.token)
+
+
+class _ThreadExtras:
+    """
+    mo_threads GIVES EACH NEW THREAD getattr(parent, MO_LOGS_EXTRAS)[-1], READ IN THE PARENT'S CONTEXT
+    """
+
+    __slots__ = ["inherited"]
+
+    def __init__(self, inherited):
+        self.inherited = inherited  # FROM THE PARENT THREAD
+
+    def __getitem__(self, index):
+        extras = _extras.get()
+        return self.inherited if extras is None else extras
+
+
+def current_extras():
+    """
+    :return: TUPLE OF EXTRAS (dicts, NEWEST FIRST) OF THE CURRENT CONTEXT (asyncio TASK, OR THREAD),
+             INCLUDING THOSE INHERITED FROM THE PARENT THREAD
+    """
+    extras = _extras.get()
+    if extras is not None:
+        return extras
+    inherited = getattr(current_thread(), MO_LOGS_EXTRAS, None)
+    return _layers(inherited[-1]) if inherited else ()
+
+
+def _layers(extras):
+    # OLDER mo_logs INHERITED ONE dict
+    return (extras,) if isinstance(extras, dict) else extras
+
+
+class ChainedParams:
+    """
+    THE params OF A LOG CALL, IN FRONT OF THE EXTRAS (THE FIRST MAP WITH A KEY WINS)
+    MADE WITHOUT COPYING ANY FIELDS; MERGED INTO ONE dict, ONCE, WHEN THE RECORD IS SERIALIZED
+    (LogItem.__data__() AND leaves() DO THAT MERGE, SO A SINK THAT WALKS THE RECORD SEES ONE dict)
+    """
+
+    __slots__ = ["_maps", "_flat"]
+
+    def __init__(self, maps):
+        self._maps = maps
+        self._flat = None
+
+    @property
+    def own(self):
+        """
+        :return: THE params GIVEN TO THE LOG CALL, WITHOUT THE EXTRAS
+        """
+        return self._maps[0]
+
+    def flatten(self):
+        """
+        :return: ONE dict
+        """
+        flat = self._flat
+        if flat is None:
+            flat = {}
+            for m in reversed(self._maps):
+                flat.update(m)
+            self._flat = flat
+        return flat
+
+    def get(self, key, default=None):
+        for m in self._maps:
+            if key in m:
+                return m[key]
+        return default
+
+    def __getitem__(self, key):
+        for m in self._maps:
+            if key in m:
+                return m[key]
+        raise KeyError(key)
+
+    def __getattr__(self, key):
+        if key.startswith("__") or key in ChainedParams.__slots__:
+            # NOT SET YET (eg WHILE UNPICKLING)
+            raise AttributeError(key)
+        for m in self._maps:
+            if key in m:
+                return to_data(m[key])
+        # ANYTHING ELSE (eg leaves()) IS LIKE Data
+        return getattr(to_data(self.flatten()), key)
+
+    def __contains__(self, key):
+        return any(key in m for m in self._maps)
+
+    def __iter__(self):
+        return iter(self.flatten())
+
+    def __len__(self):
+        return len(self.flatten())
+
+    def keys(self):
+        return self.flatten().keys()
+
+    def values(self):
+        return self.flatten().values()
+
+    def items(self):
+        return self.flatten().items()
+
+    def __eq__(self, other):
+        return self.flatten() == from_data(other)
+
+    def __data__(self):
+        return self.flatten()
+
+    def __reduce__(self):
+        return ChainedParams, ((self.flatten(),),)
+
+    def __repr__(self):
+        return f"ChainedParams({self.flatten()!r})"
 
 
 def _same_frame(frameA, frameB):
@@ -117,9 +242,27 @@ def _using_file(config):
     from mo_logs.log_usingFile import StructuredLogger_usingFile
 
     if config.file:
-        return StructuredLogger_usingFile(config.file)
+        return StructuredLogger_usingFile(file=config.file, settings=config)
     if config.filename:
-        return StructuredLogger_usingFile(config.filename)
+        return StructuredLogger_usingFile(file=config.filename, settings=config)
+
+
+def _using_jsonl(config):
+    from mo_logs.log_usingJsonLines import StructuredLogger_usingJsonLines
+
+    return StructuredLogger_usingJsonLines(settings=config)
+
+
+def _using_binary(config):
+    from mo_logs.log_usingBinary import StructuredLogger_usingBinary
+
+    return StructuredLogger_usingBinary(file=config.file or config.filename, settings=config)
+
+
+def _using_socket(config):
+    from mo_logs.log_usingSocket import StructuredLogger_usingSocket
+
+    return StructuredLogger_usingSocket(settings=config)
 
 
 def _using_console(config):
@@ -135,7 +278,7 @@ def _using_mozlog(config):
 def _using_stream(config):
     from mo_logs.log_usingStream import StructuredLogger_usingStream
 
-    return _add_thread(StructuredLogger_usingStream(config.stream))
+    return _add_thread(StructuredLogger_usingStream(stream=config.stream, settings=config))
 
 
 def _using_elasticsearch(config):
@@ -168,6 +311,9 @@ _known_loggers = {
     "none": _using_nothing,
     "null": _using_nothing,
     "file": _using_file,
+    "jsonl": _using_jsonl,
+    "binary": _using_binary,
+    "socket": _using_socket,
     "console": _using_console,
     "mozlog": _using_mozlog,
     "stream": _using_stream,
@@ -181,11 +327,11 @@ def register_logger(name, factory):
     _known_loggers[name] = factory
 
 
-def _add_thread(logger):
+def _add_thread(logger, settings=None):
     try:
         from mo_logs.log_usingThread import StructuredLogger_usingThread
 
-        return StructuredLogger_usingThread(logger)
+        return StructuredLogger_usingThread(logger, **(from_data(settings) or {}))
     except:
         return logger
 
@@ -0,0 +1,107 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+import subprocess
+import sys
+from time import time
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+from mo_threads import Till
+
+from mo_logs.aggregate import Aggregator
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.log_usingSocket import StructuredLogger_usingSocket
+from mo_logs.strings import expand_template
+
+
+@add_error_reporting
+class TestAggregate(FuzzyTestCase):
+    def setUp(self):
+        self.temp = TempDirectory()
+        self.address = os.path.join(self.temp.os_path, "logs.sock")
+        self.received = LogUsingBatches()
+
+    def tearDown(self):
+        self.temp.delete()
+
+    def test_many_producers(self):
+        aggregator = Aggregator(self.address, self.received)
+        producers = [StructuredLogger_usingSocket(self.address) for _ in range(3)]
+        for i, p in enumerate(producers):
+            p.write_many([("{params.who} says {params.num}", {"params": {"who": i, "num": n}}) for n in range(2)])
+        _wait_for(lambda: len(self.received.lines) == 6)
+        for p in producers:
+            p.stop()
+        aggregator.stop()
+
+        self.assertEqual(
+            sorted(self.received.lines), sorted(f"{i} says {n}" for i in range(3) for n in range(2)),
+        )
+        self.assertEqual(aggregator.stats["datagrams"], 3)
+
+    def test_spill_until_listening(self):
+        producer = StructuredLogger_usingSocket(self.address)
+        producer.write("line {params.num}", {"params": {"num": 0}})  # NOBODY LISTENING
+        producer.write("line {params.num}", {"params": {"num": 1}})
+        self.assertEqual(producer.stats["held"], 2)
+
+        aggregator = Aggregator(self.address, self.received)
+        producer.write("line {params.num}", {"params": {"num": 2}})
+        _wait_for(lambda: len(self.received.lines) == 3)
+        producer.stop()
+        aggregator.stop()
+
+        self.assertEqual(self.received.lines, ["line 0", "line 1", "line 2"])
+        self.assertEqual(producer.stats, {"sent": 3, "spilled": 2, "dropped": 0, "held": 0})
+
+    def test_spill_is_bounded(self):
+        producer = StructuredLogger_usingSocket(self.address, max_spill=2)
+        for i in range(5):
+            producer.write("line {params.num}", {"params": {"num": i}})
+        self.assertEqual(producer.stats["dropped"], 3)
+
+        aggregator = Aggregator(self.address, self.received)
+        producer.stop()
+        _wait_for(lambda: len(self.received.lines) == 2)
+        aggregator.stop()
+
+        self.assertEqual(self.received.lines, ["line 3", "line 4"])
+
+    def test_child_processes(self):
+        aggregator = Aggregator(self.address, self.received)
+        code = f"""
+import sys
+from mo_logs import logger
+with logger.start(logs={{"log_type": "socket", "address": {self.address!r}}}):
+    logger.info("child {{num}} says hello", num=int(sys.argv[1]))
+"""
+        root = os.path.dirname(os.path.dirname(__file__))
+        children = [subprocess.Popen([sys.executable, "-c", code, str(i)], cwd=root) for i in range(3)]
+        for c in children:
+            c.wait()
+        _wait_for(lambda: len(self.received.lines) == 3)
+        aggregator.stop()
+
+        self.assertEqual(sorted(self.received.lines), [f"child {i} says hello" for i in range(3)])
+
+
+class LogUsingBatches(StructuredLogger):
+    def __init__(self):
+        self.lines = []
+
+    def write_many(self, records):
+        self.lines.extend(expand_template(template, params) for template, params in records)
+
+
+def _wait_for(condition, timeout=10):
+    end = time() + timeout
+    while not condition() and time() < end:
+        Till(seconds=0.01).wait()
@@ -0,0 +1,103 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import asyncio
+
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+from mo_threads import Thread
+
+from mo_logs import logger
+from mo_logs.log_usingAsync import AsyncStructuredLogger, StructuredLogger_usingAsync
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.strings import expand_template
+
+
+@add_error_reporting
+class TestAsync(FuzzyTestCase):
+    def test_extras_follow_tasks(self):
+        lines = LogUsingList()
+
+        async def request(num):
+            with logger.extras(request=num):
+                await asyncio.sleep(0.01 * (3 - num))  # OTHER REQUESTS RUN MEANWHILE
+                logger.info("request {num}", num=num)
+
+        async def main():
+            await asyncio.gather(*(request(num) for num in range(3)))
+
+        with logger.start(logs=lines):
+            asyncio.run(main())
+
+        self.assertEqual(
+            sorted((p["params"]["num"], p["params"]["request"]) for _, p in lines.records), [(0, 0), (1, 1), (2, 2)],
+        )
+
+    def test_extras_inherited_by_threads(self):
+        lines = LogUsingList()
+        with logger.start(logs=lines):
+            with logger.extras(request=42):
+                Thread.run("child", lambda please_stop: logger.info("from child")).join()
+            logger.info("after")
+
+        (_, child), (_, after) = lines.records
+        self.assertEqual(child["params"]["request"], 42)
+        self.assertNotIn("request", after["params"])
+
+    def test_async_sink(self):
+        sink = LogUsingAwait()
+
+        async def main():
+            with logger.start(logs=sink, loop=True):
+                for num in range(100):
+                    logger.info("line {num}", num=num)
+                self.assertEqual(sink.lines, [])  # NOTHING SENT UNTIL THE LOOP GETS CONTROL
+                await logger.flush()
+                self.assertEqual(logger.main_log.stats["batches"], 1)
+
+        asyncio.run(main())
+        self.assertEqual(sink.lines, [f"line {num}" for num in range(100)])
+        self.assertEqual(len(sink.batches), 1)
+
+    def test_write_from_other_thread(self):
+        sink = LogUsingAwait()
+
+        async def main():
+            log = StructuredLogger_usingAsync(sink)
+            thread = Thread.run(
+                "writer", lambda please_stop: log.write("from {params.name}", {"params": {"name": "thread"}})
+            )
+            while not sink.lines:
+                await asyncio.sleep(0.01)
+            thread.join()
+            await log.flush()
+            log.stop()
+            return log.stats
+
+        stats = asyncio.run(main())
+        self.assertEqual(sink.lines, ["from thread"])
+        self.assertEqual(stats, {"batches": 1, "records": 1, "dropped": 0, "errors": 0})
+
+
+class LogUsingList(StructuredLogger):
+    def __init__(self):
+        self.records = []
+
+    def write(self, template, params):
+        self.records.append((template, params))
+
+
+class LogUsingAwait(AsyncStructuredLogger):
+    def __init__(self):
+        self.lines = []
+        self.batches = []
+
+    async def write_many(self, records):
+        await asyncio.sleep(0)
+        self.batches.append(len(records))
+        self.lines.extend(expand_template(template, params) for template, params in records)
@@ -0,0 +1,137 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+from datetime import datetime
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+
+from mo_logs import logger
+from mo_logs import binary
+from mo_logs.binary import read_records, main
+from mo_logs.log_usingBinary import StructuredLogger_usingBinary
+from mo_logs.strings import expand_template
+
+
+@add_error_reporting
+class TestBinary(FuzzyTestCase):
+    def setUp(self):
+        self.temp = TempDirectory()
+        self.filename = os.path.join(self.temp.os_path, "test.bin")
+
+    def tearDown(self):
+        self.temp.delete()
+
+    def test_round_trip(self):
+        with logger.start(logs={"log_type": "binary", "file": self.filename}):
+            logger.info("data {data}", data={"a": [1, -2, 3.5, None, True]}, name="kyle")
+            try:
+                raise Exception("problem")
+            except Exception as cause:
+                logger.warning("report", cause=cause)
+
+        (t1, info), (t2, warning) = list(read_records(self.filename))
+        self.assertEqual(
+            info, {"severity": "NOTE", "template": "data {data}", "params": {"data": {"a": [1, -2, 3.5, None, True]}}}
+        )
+        self.assertEqual(info.params.name, "kyle")
+        self.assertIsInstance(info.timestamp, datetime)
+        self.assertEqual(warning.severity, "WARNING")
+        self.assertEqual(warning.cause.template, "Exception: problem")
+        self.assertEqual(warning.trace[0].method, "test_round_trip")
+        self.assertIn("problem", expand_template(t2, warning))
+
+    def test_timestamps(self):
+        log = StructuredLogger_usingBinary(self.filename)
+        times = [datetime(2024, 1, 1, 12, 0, 0, 123456), datetime(2024, 1, 1, 11, 59, 59), datetime(2025, 6, 1)]
+        log.write_many([("at {{timestamp}}", {"severity": "NOTE", "timestamp": t}) for t in times])
+        log.stop()
+
+        self.assertEqual([p.timestamp for _, p in read_records(self.filename)], times)
+
+    def test_full_dictionary(self):
+        max_strings, binary.MAX_STRINGS = binary.MAX_STRINGS, 5
+        try:
+            log = StructuredLogger_usingBinary(self.filename)
+            log.write_many([
+                (f"line {i} {{params.key{i}}}", {"severity": "NOTE", "params": {f"key{i}": i}}) for i in range(20)
+            ])
+            log.stop()
+        finally:
+            binary.MAX_STRINGS = max_strings
+
+        self.assertEqual(
+            [expand_template(t, p) for t, p in read_records(self.filename)], [f"line {i} {i}" for i in range(20)]
+        )
+
+    def test_truncated(self):
+        log = StructuredLogger_usingBinary(self.filename)
+        log.write_many([("line {params.num}", {"severity": "NOTE", "params": {"num": i}}) for i in range(3)])
+        log.stop()
+        with open(self.filename, "r+b") as f:
+            f.truncate(os.path.getsize(self.filename) - 2)  # LIKE A CRASH MID-WRITE
+
+        self.assertEqual([expand_template(t, p) for t, p in read_records(self.filename)], ["line 0", "line 1"])
+
+    def test_smaller_than_text(self):
+        text_file = os.path.join(self.temp.os_path, "test.log")
+        logs = [{"log_type": "file", "file": text_file}, {"log_type": "binary", "file": self.filename}]
+        with logger.start(trace=True, logs=logs):
+            for i in range(100):
+                logger.info("request {path} took {duration}ms", path="/index.html", duration=i)
+
+        self.assertEqual(len(list(read_records(self.filename))), 100)
+        self.assertLess(os.path.getsize(self.filename) * 2, os.path.getsize(text_file))
+
+    def test_index(self):
+        from mo_logs.index import find_regions
+
+        log = StructuredLogger_usingBinary(self.filename, index=True, index_period=60)
+        machine = {"name": "vm", "pid": 42}
+        for minute in range(4):
+            severity = "ERROR" if minute == 2 else "NOTE"
+            log.write_many([
+                (
+                    "{machine.name} line {params.num}",
+                    {
+                        "severity": severity,
+                        "template": "line {num}",
+                        "timestamp": datetime(2024, 1, 1, 0, minute, i),
+                        "params": {"num": minute * 10 + i},
+                        "machine": machine,
+                    },
+                )
+                for i in range(3)
+            ])
+
+        def lines(**query):
+            return [expand_template(t, p) for t, p in read_records(self.filename, **query)]
+
+        regions = find_regions(self.filename, severity="ERROR")
+        self.assertEqual(len(regions), 1)  # THE ERROR BUCKET, MERGED WITH THE UNINDEXED TAIL
+        self.assertGreater(regions[0]["offset"], os.path.getsize(self.filename) / 2)
+        self.assertEqual(lines(severity="ERROR"), ["vm line 20", "vm line 21", "vm line 22"])
+        start, end = datetime(2024, 1, 1, 0, 1, 2), datetime(2024, 1, 1, 0, 2, 1)
+        self.assertEqual(lines(start=start, end=end), ["vm line 12", "vm line 20"])
+        self.assertEqual(lines(start=datetime(2024, 1, 1, 0, 3, 1)), ["vm line 31", "vm line 32"])  # UNINDEXED TAIL
+        log.stop()
+        self.assertEqual(lines(start=datetime(2024, 1, 1, 0, 3, 1)), ["vm line 31", "vm line 32"])
+
+    def test_cli(self):
+        log = StructuredLogger_usingBinary(self.filename)
+        log.write("hello {params.name}", {"severity": "NOTE", "params": {"name": "world"}})
+        log.stop()
+
+        from io import StringIO
+        from contextlib import redirect_stdout
+
+        with redirect_stdout(StringIO()) as output:
+            main(["--expand", self.filename])
+        self.assertEqual(output.getvalue(), "hello world\n")
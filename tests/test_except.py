@@ -8,7 +8,9 @@
 # Author: Kyle Lahnakoski (kyle@lahnakoski.com)
 #
 import logging
+import pickle
 import sys
+import traceback
 import zlib
 from unittest import skip
 
@@ -17,7 +19,7 @@ from mo_dots.objects import DataObject
 from mo_json import value2json
 from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
 
-from mo_logs import Except, logger, ERROR, TOO_DEEP
+from mo_logs import Except, logger, ERROR, TOO_DEEP, get_stacktrace
 from tests.utils.log_usingQueue import StructuredLogger_usingQueue
 
 
@@ -343,6 +345,35 @@ class TestExcept(FuzzyTestCase):
         text = str(cause)
         self.assertNotIn("not shown", text)
 
+    def test_get_stacktrace(self):
+        actual, expected = get_stacktrace(), traceback.extract_stack()
+        expected = [{"file": f.filename, "line": f.lineno, "method": f.name} for f in reversed(expected)]
+        self.assertEqual(actual, expected)
+
+    def test_trace_made_when_needed(self):
+        try:
+            problem_a2()
+        except Except as cause:
+            self.assertIsNone(cause._trace)
+            self.assertEqual(cause.trace[0]["method"], "problem_a2")
+            self.assertEqual(cause.__data__().trace[0].method, "problem_a2")
+            self.assertIsNotNone(cause._trace)
+
+    def test_frames_are_shared(self):
+        traces = []
+        for _ in range(2):
+            traces.append(get_stacktrace())
+        self.assertIs(traces[0][0], traces[1][0])
+        self.assertEqual(traces[0][0]["method"], "test_frames_are_shared")
+        with self.assertRaises(Exception):
+            traces[0][0].method = "changed"
+
+    def test_pickle_except(self):
+        cause = Except(ERROR, "problem {num}", params={"num": 42})
+        copy = pickle.loads(pickle.dumps(cause))
+        self.assertEqual(copy.message, "problem 42")
+        self.assertEqual(copy.trace, cause.trace)
+
 
 def problem_a():
     problem_b()
@@ -0,0 +1,217 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+from threading import Event
+from time import sleep, time
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+
+from mo_logs import log_usingFile
+from mo_logs import index
+from mo_logs.compression import read_lines
+from mo_logs.log_usingFile import StructuredLogger_usingFile
+
+
+@add_error_reporting
+class TestFile(FuzzyTestCase):
+    def setUp(self):
+        self.temp = TempDirectory()
+        self.filename = os.path.join(self.temp.os_path, "test.log")
+
+    def tearDown(self):
+        self.temp.delete()
+
+    def test_batch_is_one_line_each(self):
+        log = StructuredLogger_usingFile(self.filename)
+        log.write_many([("line {num}", {"num": i}) for i in range(3)])
+        log.write("line {num}", {"num": 3})
+        log.stop()
+
+        self.assertEqual(_read(self.filename), "line 0\nline 1\nline 2\nline 3\n")
+
+    def test_rotate_by_size(self):
+        log = StructuredLogger_usingFile(self.filename, max_size=20, retention=2)
+        for i in range(5):
+            log.write("line {num}", {"num": i})  # 7 BYTES EACH
+        log.stop()
+
+        self.assertEqual(_read(self.filename), "line 4\n")
+        self.assertEqual(_read(self.filename + ".1"), "line 2\nline 3\n")
+        self.assertEqual(_read(self.filename + ".2"), "line 0\nline 1\n")
+        self.assertFalse(os.path.exists(self.filename + ".3"))
+
+    def test_rotate_by_time(self):
+        log = StructuredLogger_usingFile(self.filename, interval=60)
+        log.write("line {num}", {"num": 0})
+        log.next_rotation -= 60  # PRETEND A MINUTE HAS PASSED
+        log.write("line {num}", {"num": 1})
+        log.stop()
+
+        self.assertEqual(_read(self.filename), "line 1\n")
+        self.assertEqual(_read(self.filename + ".1"), "line 0\n")
+
+    def test_external_rename(self):
+        log = StructuredLogger_usingFile(self.filename)
+        log.write("line {num}", {"num": 0})
+        os.rename(self.filename, self.filename + ".old")  # LIKE logrotate
+        log.write("line {num}", {"num": 1})  # STILL GOES TO OLD FILE, UNTIL CHECKED
+        log.next_check = 0
+        log.write("line {num}", {"num": 2})
+        log.stop()
+
+        self.assertEqual(_read(self.filename + ".old"), "line 0\nline 1\n")
+        self.assertEqual(_read(self.filename), "line 2\n")
+
+    def test_fsync_per_batch(self):
+        synced = []
+        old_fsync, log_usingFile.os.fsync = log_usingFile.os.fsync, synced.append
+        try:
+            log = StructuredLogger_usingFile(self.filename, fsync="batch")
+            log.write_many([("line {num}", {"num": i}) for i in range(3)])
+            log.write("line {num}", {"num": 3})
+            self.assertEqual(len(synced), 2)
+            log.stop()
+        finally:
+            log_usingFile.os.fsync = old_fsync
+
+    def test_fsync_interval_syncs_last_batch(self):
+        synced = []
+        old_fsync, log_usingFile.os.fsync = log_usingFile.os.fsync, synced.append
+        try:
+            log = StructuredLogger_usingFile(self.filename, fsync="interval", fsync_interval=0.1)
+            log.write("line {num}", {"num": 0})
+            log.write("line {num}", {"num": 1})  # TOO SOON TO SYNC
+            self.assertEqual(len(synced), 1)
+            sleep(0.5)  # NOTHING MORE IS WRITTEN
+            self.assertEqual(len(synced), 2)
+            log.stop()
+        finally:
+            log_usingFile.os.fsync = old_fsync
+
+    def test_gzip(self):
+        log = StructuredLogger_usingFile(self.filename, compression="gzip")
+        log.write_many([("line {num}", {"num": i}) for i in range(3)])
+        log.write("line {num}", {"num": 3})
+        log.stop()
+
+        with open(self.filename, "rb") as f:
+            self.assertEqual(f.read(2), b"\x1f\x8b")
+        self.assertEqual(list(read_lines(self.filename)), [f"line {i}" for i in range(4)])
+
+    def test_gzip_survives_crash(self):
+        log = StructuredLogger_usingFile(self.filename, compression="gzip")
+        log.write_many([("line {num}", {"num": i}) for i in range(3)])
+        log.write("line {num}", {"num": 3})
+        # NO stop(), SO NO GZIP TRAILER
+
+        self.assertEqual(list(read_lines(self.filename)), [f"line {i}" for i in range(4)])
+        log.stop()
+
+    def test_gzip_rotates_by_size_on_disk(self):
+        log = StructuredLogger_usingFile(self.filename, max_size=60, compression="gzip")
+        for i in range(10):
+            log.write("line {num}", {"num": i})  # ABOUT 10 COMPRESSED BYTES EACH
+        log.stop()
+
+        self.assertEqual(list(read_lines(self.filename + ".1")), [f"line {i}" for i in range(5)])
+        self.assertEqual(list(read_lines(self.filename)), [f"line {i}" for i in range(5, 10)])
+        self.assertFalse(os.path.exists(self.filename + ".2"))
+
+    def test_compress_rotated(self):
+        log = StructuredLogger_usingFile(self.filename, max_size=20, compress_rotated="gzip")
+        for i in range(5):
+            log.write("line {num}", {"num": i})
+        log.stop()
+
+        self.assertEqual(list(read_lines(self.filename)), ["line 4"])
+        self.assertEqual(list(read_lines(self.filename + ".1.gz")), ["line 2", "line 3"])
+        self.assertEqual(list(read_lines(self.filename + ".2.gz")), ["line 0", "line 1"])
+        self.assertFalse(os.path.exists(self.filename + ".1"))
+
+    def test_compress_rotated_does_not_block_writer(self):
+        release = Event()
+        compress_file = log_usingFile.compress_file
+
+        def slow_compress(*args):
+            release.wait(10)
+            return compress_file(*args)
+
+        log_usingFile.compress_file = slow_compress
+        try:
+            log = StructuredLogger_usingFile(self.filename, max_size=20, compress_rotated="gzip")
+            start = time()
+            for i in range(7):
+                log.write("line {num}", {"num": i})  # ROTATES TWICE, WHILE THE FIRST IS STILL COMPRESSING
+            self.assertLess(time() - start, 5)
+            release.set()
+            log.stop()
+        finally:
+            log_usingFile.compress_file = compress_file
+
+        self.assertEqual(list(read_lines(self.filename)), ["line 6"])
+        self.assertEqual(list(read_lines(self.filename + ".1.gz")), ["line 4", "line 5"])
+        self.assertEqual(list(read_lines(self.filename + ".2.gz")), ["line 2", "line 3"])
+        self.assertEqual(list(read_lines(self.filename + ".3.gz")), ["line 0", "line 1"])
+        self.assertEqual(
+            sorted(os.listdir(self.temp.os_path)), ["test.log", "test.log.1.gz", "test.log.2.gz", "test.log.3.gz"]
+        )
+
+    def test_compress_rotated_and_compression(self):
+        with self.assertRaises("already compressed"):
+            StructuredLogger_usingFile(self.filename, compression="gzip", compress_rotated="gzip")
+
+    def test_index(self):
+        log = StructuredLogger_usingFile(self.filename, index=True, index_period=60)
+        for minute in range(3):
+            severity = "ERROR" if minute == 1 else "NOTE"
+            log.write_many([
+                ("line {num}", {"severity": severity, "template": "line {num}", "timestamp": minute * 60 + i, "num": i})
+                for i in range(2)
+            ])
+        log.write("last", {"severity": "NOTE", "template": "last", "timestamp": 180})  # NOT IN THE INDEX YET
+
+        regions = index.find_regions(self.filename, severity="ERROR")
+        self.assertEqual(regions, [{"offset": 14, "end": 28}, {"offset": 42, "end": None}])
+        self.assertEqual(list(index.read_lines(self.filename, start=60, end=120)), ["line 0", "line 1", "last"])
+        self.assertEqual(list(index.read_lines(self.filename, template="last")), ["last"])
+        log.stop()
+        self.assertEqual(list(index.read_lines(self.filename, template="last")), ["last"])
+
+    def test_index_rotates(self):
+        log = StructuredLogger_usingFile(self.filename, max_size=20, index=True)
+        for i in range(3):
+            log.write("line {num}", {"severity": "NOTE", "template": "line", "timestamp": i, "num": i})
+        log.stop()
+
+        self.assertEqual(list(index.read_lines(self.filename, start=2)), ["line 2"])
+        self.assertEqual(list(index.read_lines(self.filename + ".1", start=1)), ["line 0", "line 1"])
+        self.assertEqual(list(index.read_lines(self.filename + ".1", start=2)), [])
+
+    def test_index_caps_templates(self):
+        max_templates, index.MAX_TEMPLATES, index.OTHER_TEMPLATE = index.MAX_TEMPLATES, 2, 2
+        try:
+            log = StructuredLogger_usingFile(self.filename, index=True, index_period=1)
+            for i in range(5):
+                log.write(f"line {i}", {"severity": "NOTE", "template": f"line {i}", "timestamp": i})
+            log.stop()
+
+            templates, entries = index.read_index(self.filename)
+            self.assertEqual(templates, ["line 0", "line 1"])
+            self.assertLess(max(e["templates"] for e in entries), 1 << 3)
+            self.assertEqual(list(index.read_lines(self.filename, template="line 1")), ["line 1"])
+            self.assertEqual(list(index.read_lines(self.filename, template="line 3")), ["line 2", "line 3", "line 4"])
+        finally:
+            index.MAX_TEMPLATES, index.OTHER_TEMPLATE = max_templates, max_templates
+
+
+def _read(filename):
+    with open(filename, "rb") as f:
+        return f.read().decode("utf8")
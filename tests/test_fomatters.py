@@ -68,3 +68,14 @@ class TestFormatters(FuzzyTestCase):
     def test_html(self):
         test = expand_template("{{html|html}}", {"html": "<p>hello</p>"})
         self.assertEqual(test, "&lt;p&gt;hello&lt;/p&gt;")
+
+    def test_formatter_arguments(self):
+        test = expand_template("{{value|replace(\"a\", replace=\"b\")}}", {"value": "banana"})
+        self.assertEqual(test, "bbnbnb")
+
+        test = expand_template("{{value|left_align(5)}}|", {"value": "ab"})
+        self.assertEqual(test, "ab   |")
+
+    def test_formatter_arguments_are_literal(self):
+        test = expand_template("{{value|limit(__import__('os').getpid())}}", {"value": "test"})
+        self.assertIn("Can not parse arguments", test)
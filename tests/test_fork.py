@@ -0,0 +1,110 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+import subprocess
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+
+from mo_logs.binary import read_records
+from mo_logs.log_usingBinary import StructuredLogger_usingBinary
+from mo_logs.log_usingThread import StructuredLogger_usingThread
+from mo_logs.strings import expand_template
+
+
+@add_error_reporting
+@unittest.skipUnless(hasattr(os, "fork"), "requires os.fork()")
+class TestFork(FuzzyTestCase):
+    def setUp(self):
+        self.temp = TempDirectory()
+
+    def tearDown(self):
+        self.temp.delete()
+
+    def test_fork_while_logging(self):
+        filename = os.path.join(self.temp.os_path, "app.log")
+        code = f"""
+import os
+import sys
+from mo_threads import Thread, Till
+from mo_logs import logger
+
+def spam(t, please_stop):
+    i = 0
+    while not please_stop:
+        logger.info("spam {{t}} {{i}}", t=t, i=i)
+        i += 1
+
+logger.start(logs={{"log_type": "file", "file": {filename!r}}}, queue={{"max_latency": 0.01}})
+threads = [Thread.run("spam " + str(t), spam, t) for t in range(4)]
+children = []
+for n in range(10):
+    Till(seconds=0.01).wait()
+    pid = os.fork()
+    if pid == 0:
+        logger.info("child {{num}}", num=n)
+        sys.exit(0)  # NORMAL SHUTDOWN, WHICH STOPS THE LOGGING THREAD
+    children.append(pid)
+failed = [pid for pid in children if os.waitpid(pid, 0)[1]]
+for t in threads:
+    t.stop()
+    t.join()
+logger.stop()
+sys.exit(len(failed))
+"""
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)), timeout=60, check=False,
+        )
+        self.assertEqual(result.returncode, 0)
+
+        with open(filename, encoding="utf8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(sorted(line for line in lines if line.startswith("child")), [f"child {n}" for n in range(10)])
+        # NOTHING THE PARENT QUEUED IS WRITTEN TWICE, OR PART WAY
+        spam = [line for line in lines if line.startswith("spam")]
+        self.assertGreater(len(spam), 0)
+        self.assertEqual(len(spam), len(set(spam)))
+        self.assertEqual(len(spam) + 10, len(lines))
+
+    def test_fork_hooks_when_mo_threads_changes(self):
+        from mo_logs import logger
+
+        # AS IF AN UPGRADE OF mo_threads RENAMED ITS PRIVATE STATE
+        with patch.dict(sys.modules, {"mo_threads.till": SimpleNamespace()}):
+            self.assertEqual(logger._mo_threads_locks(), ())
+            with logger.start():
+                logger._before_fork()
+                logger._after_fork_in_parent()
+                logger.info("still logging")
+
+    def test_binary_child_has_own_file(self):
+        filename = os.path.join(self.temp.os_path, "app.bin")
+        log = StructuredLogger_usingThread(StructuredLogger_usingBinary(filename), max_latency=60)
+        log.write("parent {params.num}", {"severity": "INFO", "params": {"num": 1}})
+        log.before_fork()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                log.after_fork(True)
+                log.write("child {params.num}", {"severity": "INFO", "params": {"num": 2}})
+                log.stop()
+            finally:
+                os._exit(0)
+        log.after_fork(False)
+        os.waitpid(pid, 0)
+        log.stop()
+
+        self.assertEqual([expand_template(t, p) for t, p in read_records(filename)], ["parent 1"])
+        child = [expand_template(t, p) for t, p in read_records(f"{filename}.{pid}")]
+        self.assertEqual(child, ["child 2"])
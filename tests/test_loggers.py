@@ -13,13 +13,13 @@ from unittest import skip
 
 from mo_dots import Data, Null, register_primitive
 from mo_files import File
-from mo_future import StringIO
+from mo_future import StringIO, BytesIO
 from mo_kwargs import override
 from mo_testing.fuzzytestcase import FuzzyTestCase
 from mo_threads import Till, stop_main_thread, start_main_thread, Signal, Thread, join_all_threads
 from mo_times import Date
 
-from mo_logs import logger as log, register_logger
+from mo_logs import logger as log, register_logger, Lazy
 from mo_logs.log_usingNothing import StructuredLogger
 from mo_logs.strings import expand_template
 from tests.utils import add_error_reporting
@@ -220,6 +220,313 @@ class TestLoggers(FuzzyTestCase):
         self.assertEqual("line 0", logger.lines[0])
         self.assertEqual("line 1", logger.lines[1])
 
+    def test_template_cache_is_bounded(self):
+        with log.start(cache_size=10):
+            logger = log.main_log = LogUsingLines()
+            for i in range(100):
+                log.info("line {num} " + str(i), num=i)
+            for i in range(3):
+                log.info("same line {num}", num=i)
+            stats = log.stats()
+
+        self.assertEqual(logger.lines[99], "line 99 99")
+        self.assertEqual(stats.templates.size, 10)
+        self.assertEqual(stats.templates.max_size, 10)
+        self.assertGreaterEqual(stats.templates.evictions, 90)
+        self.assertGreaterEqual(stats.templates.hits, 2)
+        self.assertEqual(log.stats().templates.max_size, 10_000)
+
+    def test_min_severity(self):
+        with log.start(min_severity="warning"):
+            logger = log.main_log = LogUsingLines()
+            log.info("not shown")
+            log.alarm("not shown")
+            log.warning("shown")
+            log.set_severity("NOTE")
+            log.info("shown again")
+
+        self.assertEqual(len(logger.lines), 2)
+        self.assertIn("shown", logger.lines[0])
+        self.assertEqual(logger.lines[1], "shown again")
+
+    def test_module_severity(self):
+        with log.start(module_severity={"tests": "WARNING"}):
+            logger = log.main_log = LogUsingLines()
+            log.info("not shown")
+            log.set_severity(None, module="tests")
+            log.set_severity("ERROR", module="tests.test_loggers")
+            log.warning("not shown")
+            log.set_severity("NOTE", module="tests.test_loggers")
+            log.info("shown")
+            _log_from_other_module("shown")
+
+        self.assertEqual(logger.lines, ["shown", "shown"])
+        self.assertEqual(log.module_severity, {})
+
+    def test_lazy_params(self):
+        from threading import current_thread
+
+        calls = []
+
+        def expensive():
+            calls.append(current_thread())
+            return {"name": "kyle"}
+
+        lines = LogUsingLines()
+        with log.start(logs=lines, min_severity="ALARM"):
+            log.info("not shown {value}", value=Lazy(expensive))
+            log.alarm("shown {value.name} {value|json(False)}", value=Lazy(expensive))
+
+        self.assertEqual(len(calls), 1)
+        self.assertNotEqual(calls[0], current_thread())
+        self.assertIn('shown kyle {"name":"kyle"}', lines.lines[0])
+
+    def test_nested_lazy(self):
+        inner = Lazy(lambda: "kyle")
+        outer = Lazy(lambda: inner.get().upper())
+        self.assertEqual(expand_template("{name}", {"name": outer}), "KYLE")
+
+    def test_write_many(self):
+        batches = LogUsingBatches()
+        with log.start(logs=batches):
+            for i in range(100):
+                log.info("line {num}", num=i)
+
+        lines = [expand_template(template, params) for batch in batches.batches for template, params in batch]
+        self.assertEqual(lines, [f"line {i}" for i in range(100)])
+        self.assertLess(len(batches.batches), 100)
+
+    def test_warning_is_not_delayed(self):
+        batches = LogUsingBatches()
+        with log.start(logs=batches, queue={"max_latency": 30}):
+            log.info("first")
+            Till(seconds=0.5).wait()
+            self.assertEqual(batches.batches, [])  # STILL COALESCING
+
+            log.warning("urgent")
+            timeout = Till(seconds=5)
+            while not batches.batches and not timeout:
+                Till(seconds=0.01).wait()
+            stats = log.stats().thread
+
+        self.assertEqual(len(batches.batches[0]), 2)
+        self.assertEqual(stats.batches, 1)
+        self.assertEqual(stats.largest_batch, 2)
+        self.assertLess(stats.max_latency, 5)
+
+    def test_overflow_drops_are_reported(self):
+        batches = LogUsingBlockedBatches()
+        with log.start(
+            logs=batches, queue={"overflow": "drop-below-severity", "keep_severity": "warning", "max_size": 10}
+        ):
+            for i in range(100):
+                log.info("line {num}", num=i)
+            log.warning("keep me")
+            stats = log.stats().thread
+            batches.ready.go()
+
+        lines = [expand_template(template, params) for batch in batches.batches for template, params in batch]
+        dropped = stats.dropped["drop-below-severity"]
+        self.assertGreater(dropped, 0)
+        self.assertEqual(len([line for line in lines if line.startswith("line")]) + dropped, 100)
+        self.assertTrue(any("keep me" in line for line in lines))
+        self.assertEqual(lines[-1], f"{dropped} log messages dropped by drop-below-severity policy")
+
+    def test_drop_oldest_skips_thread_stop(self):
+        from mo_threads import THREAD_STOP
+        from mo_logs.log_usingThread import StructuredLogger_usingThread
+
+        logger = StructuredLogger_usingThread(LogUsingArray(), overflow="drop-oldest", max_size=2)
+        queue = logger.queue
+        with queue.lock:
+            oldest = ("oldest", {}, 0, 10)
+            queue.queue.extend([THREAD_STOP, oldest])
+            logger.queued_bytes += oldest[3]
+
+            # THE OLDEST REAL RECORD MAKES ROOM, THREAD_STOP STAYS
+            self.assertTrue(logger._make_room(("newest", {}, 0, 10)))
+            self.assertEqual(list(queue.queue), [THREAD_STOP])
+            self.assertEqual(logger.queued_bytes, 0)
+            self.assertEqual(logger.dropped["drop-oldest"], 1)
+
+            # NOTHING LEFT TO DROP, SO THE NEW RECORD IS DROPPED, AND COUNTED AS SUCH
+            self.assertFalse(logger._make_room(("newest", {}, 0, 10)))
+            self.assertEqual(logger.dropped["drop-oldest"], 1)
+            self.assertEqual(logger.dropped["drop-newest"], 1)
+            queue.queue.clear()
+        logger.stop()
+
+    def test_fan_out(self):
+        slow = LogUsingBlockedBatches()
+        fast = LogUsingBatches()
+        with log.start(logs=[slow, fast], fan_out=True):
+            log.info("line {num}", num=1)
+            timeout = Till(seconds=5)
+            while not fast.batches and not timeout:
+                Till(seconds=0.01).wait()
+            self.assertEqual(len(fast.batches), 1)  # NOT HELD UP BY slow
+            self.assertEqual(slow.batches, [])
+
+            stats = log.stats().logs
+            slow.ready.go()
+
+        self.assertEqual(len(slow.batches), 1)
+        self.assertEqual([s.type for s in stats], ["LogUsingBlockedBatches", "LogUsingBatches"])
+        self.assertEqual(stats[1].records, 1)
+
+    def test_failing_logger_recovers(self):
+        failing = LogUsingFailures(failures=2)
+        clock = FakeClock()
+        with log.start(logs=failing, breaker={"min_backoff": 100, "clock": clock}):
+            log.main_log = log.logging_multi  # NO THREAD, SO WE SEE EACH WRITE
+            log.info("line {num}", num=1)  # TRIPS BREAKER
+            self.assertEqual(log.stats().logs[0].breaker.state, "open")
+            log.info("line {num}", num=2)  # HELD
+            clock.now += 150
+            log.info("line {num}", num=3)  # PROBE FAILS
+            clock.now += 250
+            log.info("line {num}", num=4)  # PROBE SUCCEEDS
+            stats = log.stats().logs[0].breaker
+
+        self.assertEqual(stats, {"state": "closed", "trips": 1, "recoveries": 1, "failures": 2, "held": 0})
+        lines = [expand_template(template, params) for template, params in failing.lines]
+        self.assertEqual([line for line in lines if line.startswith("line")], [f"line {i}" for i in range(1, 5)])
+        self.assertTrue(any("failed! Will retry" in line for line in lines))
+
+    def test_breaker_holds_only_unsent(self):
+        from mo_logs.log_usingBreaker import StructuredLogger_usingBreaker
+
+        failing = LogUsingFailures(failures=0)
+        clock = FakeClock()
+        breaker = StructuredLogger_usingBreaker(failing, min_backoff=100, clock=clock)
+        failing.fail_at = 2
+        breaker.write_many([("line {num}", {"num": i}) for i in range(4)])  # FAILS AT line 2
+        self.assertEqual(breaker.stats["held"], 2)
+        clock.now += 150
+        breaker.write_many([])  # PROBE SUCCEEDS
+        breaker.stop()
+
+        self.assertEqual([expand_template(t, p) for t, p in failing.lines], [f"line {i}" for i in range(4)])
+
+    def test_breaker_probes_when_quiet(self):
+        from mo_logs.log_usingBreaker import StructuredLogger_usingBreaker
+
+        failing = LogUsingFailures(failures=1)
+        breaker = StructuredLogger_usingBreaker(failing, min_backoff=0.01)
+        breaker.write("line {num}", {"num": 1})
+        timeout = Till(seconds=5)
+        while not failing.lines and not timeout:
+            Till(seconds=0.01).wait()
+        breaker.stop()
+
+        self.assertEqual(breaker.stats["recoveries"], 1)
+        self.assertEqual([expand_template(t, p) for t, p in failing.lines], ["line 1"])
+
+    def test_expand_once_for_many_loggers(self):
+        first, second = LogUsingRendered(), LogUsingRendered()
+        with log.start(logs=[first, second]):
+            log.info("line {num}", num=1)
+
+        self.assertEqual(first.lines, ["line 1"])
+        self.assertIs(first.lines[0], second.lines[0])
+
+    def test_render_memo_with_freed_records(self):
+        from mo_logs.render import RenderMemo, render
+
+        with RenderMemo():
+            lines = [render("line {num}", {"num": i}) for i in range(10)]  # EACH dict IS FREED WHEN RENDERED
+
+        self.assertEqual(lines, [f"line {i}" for i in range(10)])
+
+    def test_record_is_data(self):
+        from mo_dots import is_data
+
+        log.trace = True
+        logger = log.main_log = LogUsingArray()
+        log.note("this is a {{name}}", name="test")
+        template, record = logger.lines[0]
+
+        self.assertTrue(is_data(record))
+        leaves = dict(record.leaves())
+        self.assertNotIn("params", leaves)
+        self.assertEqual(leaves["params.name"], "test")
+        self.assertNotIn("location", leaves)
+        self.assertTrue(leaves["location.file"].endswith("test_loggers.py"))
+
+    def test_stream_flushes_once_per_batch(self):
+        from mo_logs.log_usingStream import StructuredLogger_usingStream
+
+        stream = CountingStream()
+        logger = StructuredLogger_usingStream(stream)
+        logger.write_many([("line {num}", {"num": i}) for i in range(3)])
+
+        self.assertEqual(stream.getvalue(), b"line 0\nline 1\nline 2\n")
+        self.assertEqual(stream.flushes, 1)
+
+    def test_buffered_stream(self):
+        from mo_logs.log_usingStream import StructuredLogger_usingStream
+
+        stream = CountingStream()
+        logger = StructuredLogger_usingStream(stream, buffered=True, max_latency=0.2)
+        logger.write("line {num}", {"num": 0})
+        logger.write("line {num}", {"num": 1})
+        self.assertEqual(stream.getvalue(), b"")  # HELD
+
+        Till(seconds=1).wait()
+        self.assertEqual(stream.getvalue(), b"line 0\nline 1\n")
+        self.assertEqual(stream.flushes, 1)
+
+        logger.write("line {num}", {"num": 2})
+        logger.stop()
+        self.assertEqual(stream.getvalue(), b"line 0\nline 1\nline 2\n")
+
+    def test_jsonl(self):
+        import json
+
+        stream = BytesIO()
+        with log.start(logs={"log_type": "jsonl", "stream": stream}):
+            log.info("data {data}", data={"a": [1, 2]}, name="kyle")
+            try:
+                raise Exception("problem")
+            except Exception as cause:
+                log.warning("report", cause=cause)
+
+        info, warning = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual(
+            info, {"severity": "NOTE", "template": "data {data}", "params": {"data": {"a": [1, 2]}, "name": "kyle"}}
+        )
+        self.assertIsInstance(info["timestamp"], float)
+        self.assertEqual(warning["cause"]["template"], "Exception: problem")
+        self.assertEqual(warning["trace"][0]["method"], "test_jsonl")
+        self.assertNotIn("trace_text", warning)
+
+    def test_jsonl_closes_own_file(self):
+        from mo_logs.log_usingJsonLines import StructuredLogger_usingJsonLines
+
+        filename = File("tests/results/test.jsonl").abs_path
+        File(filename).parent.create()
+        try:
+            logger = StructuredLogger_usingJsonLines(filename=filename)
+            logger.write("data", {"severity": "NOTE", "template": "data"})
+            logger.stop()
+            self.assertTrue(logger.stream.closed)
+        finally:
+            File(filename).delete()
+
+    def test_jsonl_encoders_agree(self):
+        from decimal import Decimal
+        from mo_logs.log_usingJsonLines import encode, encode_orjson, orjson
+
+        if not orjson:
+            self.skipTest("orjson not installed")
+        record = Data(
+            severity="NOTE",
+            template="data {data}",
+            timestamp=datetime.datetime(2024, 1, 1),
+            params={"a": Decimal("1.5"), "b": Data(c=[1, None]), "d": b"bytes", "e": float("nan"), "f": "平和"},
+        )
+        self.assertEqual(encode(record), encode_orjson(record))
+
     def test_hex(self):
         result = expand_template("{value|hex}", {"value": "test"})
         expected = "74657374"
@@ -389,6 +696,48 @@ class TestLoggers(FuzzyTestCase):
         self.assertEqual(params.params.a, 1)
         self.assertEqual(params.params.b, 2)
 
+    def test_params_are_chained(self):
+        import json
+        from mo_logs.log_usingJsonLines import encode
+
+        old, log.main_log = log.main_log, LogUsingArray()
+
+        with log.extras(a=1, b=1, c=1):
+            with log.extras(b=2):
+                log.info("data {a} {b} {c}", c=3)
+
+        lines, log.main_log = log.main_log.lines, old
+        template, params = lines[0]
+        self.assertIsNone(params.params._flat)  # NOT MERGED UNTIL NEEDED
+        self.assertEqual(expand_template(template, params), "data 1 2 3")
+        self.assertEqual(params.params, {"a": 1, "b": 2, "c": 3})
+        self.assertEqual(json.loads(encode(params))["params"], {"a": 1, "b": 2, "c": 3})
+
+    def test_params_not_merged_by_thread(self):
+        array_log = LogUsingArray()
+        with log.start(logs=array_log):
+            with log.extras(a=1):
+                log.info("data {a} {b}", b=2)
+
+        template, params = array_log.lines[0]
+        self.assertIsNone(params.params._flat)  # A SINK THAT DOES NOT SERIALIZE DOES NOT PAY
+        self.assertEqual(expand_template(template, params), "data 1 2")
+
+    def test_leaves_with_extras(self):
+        from mo_dots import to_data
+
+        array_log = LogUsingArray()
+        with log.start(logs=array_log, extra={"a": 1}):
+            with log.extras(b=2):
+                log.info("data {c}", c=3)
+
+        template, params = array_log.lines[0]
+        leaves = dict(to_data(params).leaves())
+        self.assertNotIn("params", leaves)
+        self.assertEqual(leaves["params.a"], 1)
+        self.assertEqual(leaves["params.b"], 2)
+        self.assertEqual(leaves["params.c"], 3)
+
     def test_log_startup(self):
         array_log = LogUsingArray()
         with log.start(logs=array_log, extra={"a": 1}):
@@ -420,6 +769,11 @@ class TestLoggers(FuzzyTestCase):
         )
 
 
+def _log_from_other_module(message):
+    # PRETEND TO BE ANOTHER MODULE
+    exec("log.info(message)", {"__name__": "other_module", "log": log, "message": message})
+
+
 class LogUsingArray(StructuredLogger):
     @override
     def __init__(self, kwargs=None):
@@ -439,6 +793,64 @@ class LogUsingLines(StructuredLogger):
         self.lines.append(value)
 
 
+class LogUsingRendered(LogUsingArray):
+    def write(self, template, params):
+        from mo_logs.render import render
+
+        self.lines.append(render(template, params))
+
+
+class CountingStream(BytesIO):
+    def __init__(self):
+        BytesIO.__init__(self)
+        self.flushes = 0
+
+    def flush(self):
+        self.flushes += 1
+
+
+class LogUsingBatches(StructuredLogger):
+    def __init__(self):
+        self.batches = []
+
+    def write_many(self, records):
+        self.batches.append(list(records))
+
+
+class LogUsingFailures(LogUsingArray):
+    def __init__(self, failures):
+        LogUsingArray.__init__(self)
+        self.failures = failures
+        self.fail_at = None  # FAIL ONCE, WHEN THIS MANY LINES ARE WRITTEN
+
+    def write(self, template, params):
+        if self.failures:
+            self.failures -= 1
+            raise Exception("failure")
+        if self.fail_at == len(self.lines):
+            self.fail_at = None
+            raise Exception("failure")
+        LogUsingArray.write(self, template, params)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class LogUsingBlockedBatches(LogUsingBatches):
+    def __init__(self):
+        LogUsingBatches.__init__(self)
+        self.ready = Signal()
+
+    def write_many(self, records):
+        self.ready.wait()
+        LogUsingBatches.write_many(self, records)
+
+
 class HandlerUsingArray(logging.Handler):
 
     def __init__(self, params=None):
@@ -0,0 +1,95 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import os
+import subprocess
+import sys
+from datetime import datetime
+from threading import current_thread
+
+from mo_files import TempDirectory
+from mo_testing.fuzzytestcase import FuzzyTestCase, add_error_reporting
+
+from mo_logs import logger, Lazy
+from mo_logs.log_usingRing import StructuredLogger_usingRing, NOT_RESOLVED
+from mo_logs.ring import read_ring, HEADER_SIZE
+from mo_logs.strings import expand_template
+
+
+@add_error_reporting
+class TestRing(FuzzyTestCase):
+    def setUp(self):
+        self.temp = TempDirectory()
+        self.filename = os.path.join(self.temp.os_path, "crash.ring")
+
+    def tearDown(self):
+        self.temp.delete()
+
+    def test_wrap_around(self):
+        log = StructuredLogger_usingRing(self.filename, size=1000)
+        for i in range(100):
+            log.write("line {params.num}", {"severity": "NOTE", "params": {"num": i}})
+        log.stop()
+
+        lines = [expand_template(t, p) for t, p in read_ring(self.filename)]
+        self.assertLess(len(lines), 100)
+        self.assertEqual(lines, [f"line {i}" for i in range(100 - len(lines), 100)])
+        self.assertEqual([expand_template(t, p) for t, p in read_ring(self.filename, last=2)], ["line 98", "line 99"])
+
+    def test_continue_ring(self):
+        log = StructuredLogger_usingRing(self.filename, size=1000)
+        log.write("first", {"severity": "NOTE", "timestamp": datetime(2024, 1, 1)})
+        log.stop()
+        log = StructuredLogger_usingRing(self.filename, size=1000)
+        log.write("second", {"severity": "NOTE"})
+        log.stop()
+
+        (t1, p1), (t2, _) = read_ring(self.filename)
+        self.assertEqual([t1, t2], ["first", "second"])
+        self.assertEqual(p1.timestamp, datetime(2024, 1, 1))
+
+    def test_torn_write(self):
+        log = StructuredLogger_usingRing(self.filename, size=1000)
+        log.write_many([("line {params.num}", {"severity": "NOTE", "params": {"num": i}}) for i in range(3)])
+        cursor = log.ring.cursor
+        log.stop()
+        with open(self.filename, "r+b") as f:
+            f.seek(HEADER_SIZE + cursor - 3)
+            f.write(b"!!!")  # LIKE A CRASH MID-COPY
+
+        self.assertEqual([expand_template(t, p) for t, p in read_ring(self.filename)], ["line 0", "line 1"])
+
+    def test_survives_crash(self):
+        code = f"""
+import os
+from mo_logs import logger
+logger.start(logs={{"log_type": "nothing"}}, queue={{"max_latency": 60}}, ring={{"file": {self.filename!r}}})
+for i in range(3):
+    logger.info("line {{num}}", num=i)
+os._exit(1)  # NO CHANCE TO FLUSH THE QUEUE
+"""
+        subprocess.run([sys.executable, "-c", code], cwd=os.path.dirname(os.path.dirname(__file__)), check=False)
+
+        self.assertEqual([expand_template(t, p) for t, p in read_ring(self.filename)], [f"line {i}" for i in range(3)])
+
+    def test_lazy_not_resolved_by_caller(self):
+        calls = []
+
+        def expensive():
+            calls.append(current_thread())
+            return "value"
+
+        with logger.start(logs={"log_type": "nothing"}, ring={"file": self.filename}):
+            with logger.extras(request=42):
+                logger.info("lazy {value}", value=Lazy(expensive), num=1)
+            self.assertEqual(calls, [])
+
+        (_, params), = read_ring(self.filename)
+        self.assertEqual(params.params, {"value": NOT_RESOLVED, "num": 1})
+        self.assertNotIn("request", params.params)
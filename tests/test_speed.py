@@ -0,0 +1,196 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at https://www.mozilla.org/en-US/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+import sys
+import tracemalloc
+import traceback
+from threading import current_thread
+from timeit import repeat
+
+from mo_dots import to_data
+from mo_files import TempDirectory
+from mo_future import utcnow
+from mo_json import value2json
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+from mo_logs import logger
+from mo_logs.exceptions import get_frames, LogItem, NOTE, frame_info
+from mo_logs.log_usingJsonLines import encode
+from mo_logs.log_usingNothing import StructuredLogger
+from mo_logs.strings import CompiledTemplate, expand_template, compile_template
+from mo_logs.logger import _thread_info
+from mo_logs.utils import ChainedParams, current_extras, machine_metadata
+
+NUM = 10_000
+
+
+class TestSpeed(FuzzyTestCase):
+    def test_compiled_template(self):
+        template = "{{name|upper}} is {{age}} years old, and lives at {{address.city|quote}} ({{address.zip}})"
+        value = {"name": "kyle", "age": 50, "address": {"city": "Toronto", "zip": "M5V"}}
+        seq = (to_data(value),)
+
+        # BEFORE: TEMPLATE IS PARSED FOR EVERY RECORD
+        before = _per_record(lambda: CompiledTemplate(template).run(seq))
+        # AFTER: TEMPLATE IS PARSED ONCE
+        after = _per_record(lambda: compile_template(template).run(seq))
+
+        logger.info(
+            "expand_template per record: {before|round(places=3)}µs before, {after|round(places=3)}µs after",
+            before=before,
+            after=after,
+        )
+        self.assertEqual(
+            expand_template(template, value), 'KYLE is 50 years old, and lives at "Toronto" (M5V)',
+        )
+        self.assertLess(after, before)
+
+    def test_suppressed_note(self):
+        with logger.start():
+            logger.main_log = StructuredLogger()
+            shown = _per_record(lambda: logger.note("value is {value}", value=42))
+            logger.set_severity("WARNING")
+            suppressed = _per_record(lambda: logger.note("value is {value}", value=42))
+
+        logger.info(
+            "note() per call: {shown|round(places=3)}µs shown, {suppressed|round(places=3)}µs suppressed",
+            shown=shown,
+            suppressed=suppressed,
+        )
+        self.assertLess(suppressed * 5, shown)
+
+    def test_stack_capture(self):
+        before = _per_record(lambda: traceback.extract_stack())
+        after = _per_record(lambda: get_frames())
+
+        logger.info(
+            "stack capture: {before|round(places=3)}µs before, {after|round(places=3)}µs after",
+            before=before,
+            after=after,
+        )
+        self.assertLess(after, before)
+
+    def test_jsonl_encoder(self):
+        record = LogItem(
+            severity="NOTE", template="{{name}} is {{age}} years old", params={"name": "kyle", "age": 50}, timestamp=utcnow()
+        ).__data__()
+
+        before = _per_record(lambda: value2json(record))
+        after = _per_record(lambda: encode(record))
+
+        logger.info(
+            "json encoding: {before|round(places=3)}µs value2json, {after|round(places=3)}µs jsonl encoder",
+            before=before,
+            after=after,
+        )
+        self.assertLess(after, before)
+
+    def test_chained_params(self):
+        layers = tuple({f"field{d}_{i}": i for i in range(20)} for d in range(10))  # 10 NESTED extras
+        extra = {"app_name": "test"}
+        params = {"name": "kyle", "age": 50}
+
+        # BEFORE: EVERY CALL MERGES THE EXTRAS
+        flat = {}
+        for layer in reversed(layers):
+            flat = {**flat, **layer}
+        before = _per_record(lambda: {**flat, **extra, **params})
+        # AFTER: EVERY CALL CHAINS THE EXTRAS
+        after = _per_record(lambda: ChainedParams((params, extra) + layers))
+
+        logger.info(
+            "params per record: {before|round(places=3)}µs merged, {after|round(places=3)}µs chained",
+            before=before,
+            after=after,
+        )
+        self.assertEqual(ChainedParams((params, extra) + layers).flatten(), {**flat, **extra, **params})
+        self.assertLess(after, before)
+
+    def test_log_item_allocations(self):
+        # THE RECORD _annotate() MAKES FOR logger.info(), BEFORE AND AFTER LogItem WAS A __slots__ RECORD
+        frame = sys._getframe()
+        location = frame_info(frame.f_code, frame.f_lineno)
+        machine = machine_metadata()
+        thread = current_thread()
+        extra = {}
+
+        def before(i):
+            # _annotate() WRAPPED EACH RECORD IN A Data, WITH A NEW thread dict PER RECORD
+            item = to_data(
+                {
+                    "severity": NOTE,
+                    "template": "{{name}} is {{age}}",
+                    "params": dict(name="kyle", age=i),
+                    "timestamp": utcnow(),
+                }
+            )
+            item.machine = machine
+            item.template = LOG_FORMAT
+            item.location = location
+            item.thread = {"name": thread.name, "id": thread.ident}
+            item.params = ChainedParams((item.params, extra) + current_extras())
+            return item
+
+        def after(i):
+            item = LogItem(
+                severity=NOTE, template="{{name}} is {{age}}", params=dict(name="kyle", age=i), timestamp=utcnow()
+            )
+            item.machine = machine
+            item.template = LOG_FORMAT
+            item.location = location
+            item.thread = _thread_info(thread)
+            item.params = ChainedParams((item.params, extra) + current_extras())
+            return item
+
+        before, after = _allocations(before), _allocations(after)
+
+        logger.info(
+            "per record: {before.peak} bytes peak before, {after.peak} after; per queued record:"
+            " {before.queued} bytes before, {after.queued} after",
+            before=before,
+            after=after,
+        )
+        self.assertLess(after.queued, before.queued)
+        self.assertLessEqual(after.peak, before.peak)
+
+
+LOG_FORMAT = (
+    "{machine.name} (pid {machine.pid}) - {timestamp|datetime} -"
+    ' {thread.name} - ""{location.file}:{location.line}"" - ({location.method}) - {params.name} is {params.age}'
+)
+
+
+def _allocations(make):
+    """
+    :param make: FUNCTION THAT RETURNS ONE RECORD
+    :return: {"peak", "queued"} BYTES PER RECORD
+    """
+    for i in range(100):
+        make(i)  # WARM UP CACHES
+
+    # PEAK BYTES (INCLUDING TEMPORARIES) OF MAKING ONE RECORD THAT IS THEN RELEASED
+    tracemalloc.start()
+    for i in range(1000):
+        make(i)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # BYTES KEPT BY EACH RECORD WAITING IN A QUEUE
+    tracemalloc.start()
+    kept = [make(i) for i in range(1000)]
+    queued = tracemalloc.get_traced_memory()[0] // len(kept)
+    tracemalloc.stop()
+    return to_data({"peak": peak, "queued": queued})
+
+
+def _per_record(func):
+    """
+    RETURN BEST MICROSECONDS PER CALL
+    """
+    return min(repeat(func, number=NUM, repeat=3)) * 1_000_000 / NUM